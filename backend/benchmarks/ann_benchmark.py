@@ -0,0 +1,116 @@
+"""Compare FAISS index types on recall@k against exact search, query throughput and memory.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.ann_benchmark --synthetic 200000 --dim 384
+    python -m backend.benchmarks.ann_benchmark --index-path ./database/faiss_index --json ann.json
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import faiss
+
+from backend.services.index_factory import (
+    INDEX_TYPES,
+    apply_search_params,
+    build_index,
+    index_memory_bytes,
+    index_params_from_env,
+)
+from backend.services.sharded_index import ShardedIndex
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_index_vectors(index_path: str) -> np.ndarray:
+    """Reconstruct the stored vectors of all shards of an existing exact (flat) index"""
+    vectors = []
+    for index in ShardedIndex.load(index_path).shards.values():
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        vectors.append(inner.reconstruct_n(0, inner.ntotal))
+    return np.concatenate(vectors)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of random corpus vectors, standing in for user queries"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)].copy()
+    queries += 0.1 * rng.standard_normal(queries.shape).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def benchmark_index(index_type: str, vectors: np.ndarray, queries: np.ndarray,
+                    ground_truth: np.ndarray, k: int, search_params: Dict[str, int]) -> Dict[str, Any]:
+    params = index_params_from_env()
+    params["type"] = index_type
+    params["requested_type"] = index_type
+
+    started = time.perf_counter()
+    index = build_index(params, vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype='int64'))
+    build_seconds = time.perf_counter() - started
+    apply_search_params(index, search_params)
+
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    search_seconds = time.perf_counter() - started
+
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(found, ground_truth))
+    return {
+        "index_type": params["type"],
+        "build_params": {key: value for key, value in params.items() if key != "train_sample"},
+        "build_seconds": round(build_seconds, 3),
+        f"recall@{k}": round(hits / ground_truth.size, 4),
+        "qps": round(len(queries) / search_seconds, 1),
+        "mean_latency_ms": round(search_seconds / len(queries) * 1000, 4),
+        "memory_mb": round(index_memory_bytes(index) / 2 ** 20, 2),
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="N", help="benchmark N synthetic vectors")
+    source.add_argument("--index-path", help="benchmark the vectors of an existing flat index")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=5, help="neighbours per query (MAX_RESULTS)")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="comma-separated index types")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    vectors = synthetic_embeddings(args.synthetic, args.dim) if args.synthetic else load_index_vectors(args.index_path)
+    queries = make_queries(vectors, args.queries)
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, args.k)
+    search_params = {"nprobe": args.nprobe, "efSearch": args.ef_search}
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    results = []
+    for index_type in args.types.split(","):
+        result = benchmark_index(index_type.strip(), vectors, queries, ground_truth, args.k, search_params)
+        results.append(result)
+        print(f"{result['index_type']:>9}  recall@{args.k}={result[f'recall@{args.k}']:.4f}  "
+              f"qps={result['qps']:>10.1f}  memory={result['memory_mb']:>8.2f}MB  build={result['build_seconds']:.1f}s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"vectors": len(vectors), "dimension": int(vectors.shape[1]), "k": args.k,
+                       "search_params": search_params, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
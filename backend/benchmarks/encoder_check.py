@@ -0,0 +1,175 @@
+"""Compare the ONNX Runtime encoder with the PyTorch one: cosine drift, retrieval agreement and speed.
+
+Both encoders embed the same policy chunks and questions. Drift is the cosine
+between the two vectors of each text; agreement is the overlap of the top-k
+chunks each encoder retrieves for a question (exact search, so only the
+encoder differs). Exits non-zero if agreement falls below --min-agreement.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.encoder_check --quantize avx512_vnni
+    python -m backend.benchmarks.encoder_check --index-path ./database/faiss_index --json encoder.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from backend.benchmarks.perf_suite import generate_corpus, latency_summary
+from backend.services.chunk_store import ChunkStore
+from backend.services.chunker import StructuredChunker
+from backend.services.onnx_encoder import QUANTIZATION_CONFIGS, encoder_settings_from_env, load_onnx_model
+
+
+def encode(model, texts: List[str], batch_size: int) -> Tuple[np.ndarray, float]:
+    """L2-normalized embeddings, as the service stores them, and the seconds taken"""
+    started = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts, batch_size=batch_size), dtype='float32')
+    seconds = time.perf_counter() - started
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms, seconds
+
+
+def query_latencies(model, questions: List[str]) -> List[float]:
+    """Single-question encode times, the cost /ask pays per query"""
+    latencies = []
+    for question in questions:
+        started = time.perf_counter()
+        model.encode([question])
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k]
+
+
+def agreement(found: np.ndarray, reference: np.ndarray) -> Dict[str, float]:
+    k = reference.shape[1]
+    overlap = [len(set(row) & set(truth)) / k for row, truth in zip(found, reference)]
+    return {
+        f"overlap@{k}": round(float(np.mean(overlap)), 4),
+        "top1_agreement": round(float(np.mean(found[:, 0] == reference[:, 0])), 4),
+    }
+
+
+def cosine_summary(a: np.ndarray, b: np.ndarray) -> Dict[str, float]:
+    cosines = np.sum(a * b, axis=1)
+    return {
+        "mean": round(float(cosines.mean()), 6),
+        "p1": round(float(np.percentile(cosines, 1)), 6),
+        "min": round(float(cosines.min()), 6),
+    }
+
+
+def load_texts(args, tokenizer, max_tokens: int) -> Tuple[List[str], List[str]]:
+    """Chunks of an existing index (or of a generated corpus) and insurance questions"""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="fintell-encoder-") as workdir:
+        _, questions = generate_corpus(Path(workdir) / "questions", max(1, args.questions // 2), 3, args.seed)
+        if args.index_path and ChunkStore.exists(args.index_path):
+            store = ChunkStore(args.index_path)
+            ids = rng.sample(list(store.ids), min(args.sample, len(store)))
+            chunks = [store.get(int(chunk_id))["content"] for chunk_id in ids]
+        else:
+            generate_corpus(Path(workdir) / "policies", max(1, args.sample // 20), 5, args.seed + 1)
+            chunker = StructuredChunker(tokenizer, max_tokens=max_tokens)
+            chunks = [chunk for path in sorted((Path(workdir) / "policies").glob("*.txt"))
+                      for chunk in chunker.chunk(path.read_text(encoding='utf-8'))][:args.sample]
+    if args.questions_file:
+        with open(args.questions_file, 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    return chunks, questions[:args.questions]
+
+
+def run(args) -> Dict[str, Any]:
+    from sentence_transformers import SentenceTransformer
+    settings = encoder_settings_from_env()
+    settings["backend"] = "onnx"
+    if args.quantize is not None:
+        settings["quantize"] = args.quantize
+    if args.intra_op_threads is not None:
+        settings["intra_op_threads"] = args.intra_op_threads
+
+    reference = SentenceTransformer(args.model)
+    candidate = load_onnx_model(args.model, settings)
+    max_tokens = (getattr(reference, "max_seq_length", None) or 256) - 2
+    chunks, questions = load_texts(args, getattr(reference, "tokenizer", None), max_tokens)
+    print(f"Comparing on {len(chunks)} chunks and {len(questions)} questions")
+
+    # Warm both sessions up outside the timed region
+    reference.encode(chunks[:8])
+    candidate.encode(chunks[:8])
+    reference_chunks, reference_seconds = encode(reference, chunks, args.batch_size)
+    candidate_chunks, candidate_seconds = encode(candidate, chunks, args.batch_size)
+    reference_questions, _ = encode(reference, questions, args.batch_size)
+    candidate_questions, _ = encode(candidate, questions, args.batch_size)
+
+    k = min(args.k, len(chunks))
+    expected = top_k(reference_questions, reference_chunks, k)
+    return {
+        "config": {
+            "model": args.model,
+            "quantize": settings["quantize"],
+            "intra_op_threads": settings["intra_op_threads"],
+            "inter_op_threads": settings["inter_op_threads"],
+            "chunks": len(chunks),
+            "questions": len(questions),
+            "k": k,
+        },
+        "cosine": {
+            "chunks": cosine_summary(reference_chunks, candidate_chunks),
+            "questions": cosine_summary(reference_questions, candidate_questions),
+        },
+        # Index and questions both from the ONNX encoder: what a rebuilt index serves
+        "retrieval_rebuilt": agreement(top_k(candidate_questions, candidate_chunks, k), expected),
+        # ONNX questions against an index embedded by PyTorch: what switching without a rebuild serves
+        "retrieval_mixed": agreement(top_k(candidate_questions, reference_chunks, k), expected),
+        "speed": {
+            "torch_chunks_per_sec": round(len(chunks) / reference_seconds, 1),
+            "onnx_chunks_per_sec": round(len(chunks) / candidate_seconds, 1),
+            "speedup": round(reference_seconds / candidate_seconds, 2),
+            "torch_query": latency_summary(query_latencies(reference, questions)),
+            "onnx_query": latency_summary(query_latencies(candidate, questions)),
+        },
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--quantize", choices=QUANTIZATION_CONFIGS, help="int8 config (default: ONNX_QUANTIZE)")
+    parser.add_argument("--intra-op-threads", type=int, help="ONNX Runtime threads (default: ONNX_INTRA_OP_THREADS)")
+    parser.add_argument("--index-path", help="sample chunks from this index instead of a generated corpus")
+    parser.add_argument("--questions-file", help="questions to compare retrieval on, one per line")
+    parser.add_argument("--sample", type=int, default=2000, help="chunks to embed")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="top-k compared, MAX_RESULTS in the service")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="fail if overlap@k of the rebuilt index is below this, e.g. 0.95")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    overlap = report["retrieval_rebuilt"][f"overlap@{report['config']['k']}"]
+    if overlap < args.min_agreement:
+        print(f"Retrieval agreement {overlap} is below {args.min_agreement}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
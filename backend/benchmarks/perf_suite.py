@@ -0,0 +1,343 @@
+"""End-to-end performance suite: ingest, chunking, embedding, search and /ask latency on a synthetic corpus.
+
+Runs offline: policies are generated from a fixed seed and answers come from
+LocalDummyLLM with an artificial latency. Results are written as JSON and can
+be compared against a stored baseline.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.perf_suite --policies 200 --json perf.json
+    python -m backend.benchmarks.perf_suite --policies 200 --baseline perf.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+INSURERS = ["Suraksha General", "Bharat Life", "Navjeevan Health", "Kavach Assurance", "Sahyog Insurance"]
+PRODUCTS = ["Family Floater", "Critical Illness", "Term Plan", "Senior Citizen Health", "Motor Comprehensive"]
+TOPICS = {
+    "waiting period": "Claims for {condition} are payable only after a waiting period of {months} months from the first policy inception date.",
+    "room rent": "Room rent is covered up to {percent} percent of the sum insured per day, subject to a maximum of Rs {amount}.",
+    "maternity": "Maternity expenses including {condition} are covered up to Rs {amount} after {months} months of continuous coverage.",
+    "co-payment": "A co-payment of {percent} percent applies to every admissible claim for insured persons above {age} years.",
+    "exclusions": "The company shall not be liable for expenses arising from {condition} unless specifically endorsed.",
+    "cashless claims": "Cashless treatment is available at network hospitals on pre-authorisation within {hours} hours of admission.",
+    "free look": "The policyholder may cancel within {days} days of receipt of the policy document for a refund of premium.",
+    "renewal": "The policy is renewable for life with a grace period of {days} days, without fresh medical underwriting.",
+}
+CONDITIONS = ["cataract", "hernia", "joint replacement", "pre-existing diabetes", "caesarean delivery",
+              "dental treatment", "cosmetic surgery", "substance abuse", "adventure sports injuries"]
+# Questions the corpus cannot answer, to exercise the fallback route
+OFF_TOPIC = ["How do mutual fund SIPs work?", "What is the repo rate?", "Explain GST on gold jewellery",
+             "How is capital gains tax computed on shares?"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = [value * 1000 for value in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(float(np.mean(ms)) if ms else 0.0, 3),
+    }
+
+
+def write_pdf(path: Path, pages: List[str]):
+    """A minimal text-only PDF, one page per entry in Helvetica, that PyPDF2 extracts the lines of"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for text in pages:
+        rows = [row for line in text.split("\n") for row in textwrap.wrap(line, 110) or [""]]
+        escaped = (row.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for row in rows)
+        content = ("BT /F1 8 Tf 10 TL 36 816 Td " + " ".join(f"({row}) '" for row in escaped) + " ET").encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(page_refs))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(output))
+
+
+def generate_corpus(directory: Path, policies: int, pages_per_policy: int, seed: int,
+                    formats: Sequence[str] = ("txt",)) -> Tuple[int, List[str]]:
+    """Write synthetic policy wordings, cycling through formats; returns (pages, questions).
+
+    Text files mark pages with form feeds; PDFs have real pages, so ingest
+    exercises the PDF parser.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    questions = []
+    for number in range(policies):
+        insurer, product = rng.choice(INSURERS), rng.choice(PRODUCTS)
+        pages = []
+        for page in range(pages_per_policy):
+            lines = [f"{insurer.upper()} {product.upper()} POLICY WORDING - PAGE {page + 1}"]
+            for section, topic in enumerate(rng.sample(list(TOPICS), 4), start=1):
+                lines.append(f"SECTION {page + 1}.{section} {topic.title()}")
+                for clause in range(3):
+                    lines.append(f"({'abc'[clause]}) " + TOPICS[topic].format(
+                        condition=rng.choice(CONDITIONS), months=rng.choice([12, 24, 36, 48]),
+                        percent=rng.choice([1, 2, 10, 20]), amount=rng.randrange(5000, 100000, 500),
+                        age=rng.choice([60, 65]), hours=rng.choice([24, 48]), days=rng.choice([15, 30])
+                    ) + f" This applies to {product} plan {number}.")
+            pages.append("\n".join(lines))
+            if len(questions) < policies * 2:
+                questions.append(f"What is the {rng.choice(list(TOPICS))} under {insurer} {product} plan {number}?")
+        file_format = formats[number % len(formats)]
+        if file_format == "pdf":
+            write_pdf(directory / f"policy_{number:05d}.pdf", pages)
+        else:
+            (directory / f"policy_{number:05d}.txt").write_text("\f".join(pages), encoding='utf-8')
+    return policies * pages_per_policy, questions + OFF_TOPIC
+
+
+async def bench_ingest(service, files: List[Path], pages_per_file: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Parse rate over all files and per format; each format is loaded on its own so its rate is its parser's"""
+    results: Dict[str, Any] = {}
+    documents = []
+    total_seconds = 0.0
+    for suffix in sorted({path.suffix.lower() for path in files}):
+        group = [path for path in files if path.suffix.lower() == suffix]
+        started = time.perf_counter()
+        loaded = await service.document_loader.load_files(group)
+        seconds = time.perf_counter() - started
+        total_seconds += seconds
+        documents.extend(doc for file_documents in loaded for doc in file_documents or [])
+        results[f"{suffix.lstrip('.')}_pages_per_sec"] = round(len(group) * pages_per_file / seconds, 1)
+    pages = len(files) * pages_per_file
+    return {
+        "files": len(files),
+        "pages": pages,
+        "bytes": sum(path.stat().st_size for path in files),
+        "seconds": round(total_seconds, 3),
+        "pages_per_sec": round(pages / total_seconds, 1),
+        **results,
+    }, documents
+
+
+def bench_chunk_and_embed(service, documents: List[Dict[str, Any]], embed_sample: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    chunks = [chunk for doc in documents for chunk in service._chunk_document(doc["content"])]
+    chunk_seconds = time.perf_counter() - started
+
+    sample = chunks[:embed_sample]
+    service._embed_texts(sample[:8])  # warm-up outside the timed region
+    started = time.perf_counter()
+    for start in range(0, len(sample), service.batch_encode_size):
+        service._embed_texts(sample[start:start + service.batch_encode_size])
+    embed_seconds = time.perf_counter() - started
+    return {
+        "chunks": len(chunks),
+        "chunk_seconds": round(chunk_seconds, 3),
+        "chunks_per_sec_chunked": round(len(chunks) / chunk_seconds, 1),
+        "embedded": len(sample),
+        "embed_seconds": round(embed_seconds, 3),
+        "chunks_per_sec_embedded": round(len(sample) / embed_seconds, 1),
+    }
+
+
+def bench_search(service, questions: List[str], rounds: int) -> Dict[str, Any]:
+    """Single-query retrieval latency (encode + FAISS + BM25) and batched search throughput"""
+    queries = (questions * rounds)[:max(len(questions), 1) * rounds]
+    service._search_batch(queries[:4])  # warm-up
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        service._search_batch([query])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    service._search_batch(queries, service.batch_encode_size)
+    batch_seconds = time.perf_counter() - started
+
+    embeddings = service._embed_texts(queries)
+    started = time.perf_counter()
+    service.faiss_index.search(embeddings, service.max_results)
+    vector_seconds = time.perf_counter() - started
+    return {
+        "queries": len(queries),
+        "index_vectors": int(service.faiss_index.ntotal),
+        "sequential_qps": round(len(queries) / sum(latencies), 1),
+        **latency_summary(latencies),
+        "batched_qps": round(len(queries) / batch_seconds, 1),
+        "vector_only_qps": round(len(queries) / vector_seconds, 1),
+    }
+
+
+async def bench_ask(app, questions: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    """End-to-end POST /ask through an in-process ASGI client at a fixed concurrency"""
+    import httpx
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    used_rag = 0
+    next_request = 0
+
+    async def worker(client):
+        nonlocal next_request, used_rag
+        while next_request < requests:
+            question = questions[next_request % len(questions)]
+            next_request += 1
+            started = time.perf_counter()
+            response = await client.post("/ask", json={"question": question})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200 and response.json()["used_rag"]:
+                used_rag += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        await client.post("/ask", json={"question": questions[0]})  # warm-up
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "rps": round(requests / seconds, 1),
+        **latency_summary(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "rag_share": round(used_rag / requests, 3),
+    }
+
+
+# Metric name suffixes and whether larger values are better
+METRIC_DIRECTIONS = (("_per_sec", True), ("_qps", True), ("rps", True), ("_ms", False), ("seconds", False))
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of more than threshold (a fraction) in any throughput or latency metric"""
+    regressions = []
+    for stage, metrics in results["results"].items():
+        for name, value in metrics.items():
+            previous = baseline.get("results", {}).get(stage, {}).get(name)
+            direction = next((higher for suffix, higher in METRIC_DIRECTIONS if name.endswith(suffix)), None)
+            if direction is None or not isinstance(value, (int, float)) or not previous:
+                continue
+            change = (value - previous) / previous
+            if (direction and change < -threshold) or (not direction and change > threshold):
+                regressions.append(f"{stage}.{name}: {previous} -> {value} ({change:+.1%})")
+    return regressions
+
+
+async def run(args) -> Dict[str, Any]:
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="fintell-bench-"))
+    database = workdir / "database"
+    shutil.rmtree(database, ignore_errors=True)
+    pages, questions = generate_corpus(database, args.policies, args.pages_per_policy, args.seed, args.formats.split(","))
+
+    # The app reads its configuration at import time: isolated paths, no caches, the local LLM
+    os.environ.update({
+        "DATABASE_PATH": str(database),
+        "FAISS_INDEX_PATH": str(workdir / "faiss_index"),
+        "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+        "ANSWER_CACHE_SIZE": "0",
+        "GOOGLE_API_KEY": "",
+        "LOCAL_LLM_LATENCY_MS": str(args.llm_latency_ms),
+    })
+    from backend import main as app_module
+
+    service = app_module.rag_service
+    files = service.document_loader.list_document_files(str(database))
+    print(f"Generated {len(files)} policies ({pages} pages) in {database}")
+
+    results: Dict[str, Any] = {}
+    results["ingest"], documents = await bench_ingest(service, files, args.pages_per_policy)
+    print(f"ingest: {results['ingest']['pages_per_sec']} pages/s ("
+          + ", ".join(f"{name.split('_')[0]} {value}" for name, value in results["ingest"].items()
+                      if name.endswith("_pages_per_sec")) + ")")
+
+    started = time.perf_counter()
+    await service.initialize()
+    build_seconds = time.perf_counter() - started
+    results["embed"] = bench_chunk_and_embed(service, documents, args.embed_sample)
+    results["embed"]["index_build_seconds"] = round(build_seconds, 3)
+    print(f"embed: {results['embed']['chunks_per_sec_embedded']} chunks/s, index built in {build_seconds:.1f}s")
+
+    results["search"] = bench_search(service, questions, args.search_rounds)
+    print(f"search: {results['search']['sequential_qps']} qps sequential, p99 {results['search']['p99_ms']} ms")
+
+    results["ask"] = await bench_ask(app_module.app, questions, args.requests, args.concurrency)
+    print(f"/ask: {results['ask']['rps']} req/s, p50 {results['ask']['p50_ms']} ms, p99 {results['ask']['p99_ms']} ms")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "workdir")},
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_model": service.embedding_model_id,
+            "embedding_backend": service.encoder_settings["backend"],
+            "index_type": service.manifest.get("index", {}).get("type"),
+        },
+        "results": results,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=100, help="synthetic policy documents to generate")
+    parser.add_argument("--pages-per-policy", type=int, default=5)
+    parser.add_argument("--formats", default="pdf,txt", help="file formats the policies cycle through: pdf, txt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed-sample", type=int, default=2000, help="chunks encoded for the embedding rate")
+    parser.add_argument("--search-rounds", type=int, default=3, help="passes over the question set for search latency")
+    parser.add_argument("--requests", type=int, default=500, help="/ask requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent /ask clients")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="artificial LocalDummyLLM latency")
+    parser.add_argument("--workdir", help="keep the corpus and index here instead of a temporary directory")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression, e.g. 0.10 = 10%%")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Warning: {args.baseline} was run with different settings: {baseline.get('config')}")
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
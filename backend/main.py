@@ -1,12 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import os
+import json
+import time
+import asyncio
+import secrets
 from dotenv import load_dotenv
 
-from backend.services.rag_service import FinanceRAGService
+from backend.services.rag_service import FinanceRAGService, RetrievalResult
+from backend.services.answer_cache import SemanticAnswerCache
 from backend.services import llm_service as llm_service_module
+from backend.services import metrics
+from backend.services.llm_scheduler import LLMDeadlineExceeded, LLMOverloaded
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +36,13 @@ app.add_middleware(
 
 # Initialize insurance-focused services
 rag_service = FinanceRAGService()
+# Answers to repeated or near-identical questions, invalidated whenever the index changes
+answer_cache = SemanticAnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 1000)),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95)),
+    max_bytes=int(os.getenv("ANSWER_CACHE_MAX_BYTES", 50 * 2 ** 20))
+)
 # Initialize LLM service lazily to avoid failing on missing API keys during startup
 llm_service: Optional[llm_service_module.FinanceRAGService] = None
 
@@ -39,8 +54,49 @@ def get_llm_service() -> llm_service_module.FinanceRAGService:
         llm_service = llm_service_module.FinanceRAGService()
     return llm_service
 
+# Queue depths are read at scrape time; stage timings and counters are recorded as requests run
+metrics.registry.register(metrics.Gauge(
+    "fintell_embedding_queue_depth", "Queries waiting to be batched for embedding",
+    lambda: rag_service.query_batcher.stats()["pending"]))
+metrics.registry.register(metrics.Gauge(
+    "fintell_llm_queue_depth", "LLM calls waiting for a model slot",
+    lambda: llm_service.scheduler.queued if llm_service is not None else 0))
+metrics.registry.register(metrics.Gauge(
+    "fintell_llm_in_flight", "LLM calls currently running",
+    lambda: llm_service.scheduler.in_flight if llm_service is not None else 0))
+metrics.registry.register(metrics.Gauge(
+    "fintell_ready", "1 once the model and index are loaded and warmed up", lambda: int(rag_service.ready)))
+metrics.registry.register(metrics.Gauge(
+    "fintell_index_chunks", "Chunks in the served index", lambda: len(rag_service.documents)))
+metrics.registry.register(metrics.Gauge(
+    "fintell_index_version", "Index version, bumped on every rebuild", lambda: rag_service.index_version))
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Collect per-stage durations for the request and report them in a Server-Timing header"""
+    started = time.perf_counter()
+    timings, token = metrics.start_request_timings()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.finish_request_timings(token)
+    elapsed = time.perf_counter() - started
+    # Streaming responses report only the stages before the first byte
+    response.headers["Server-Timing"] = metrics.server_timing_header(timings, elapsed)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.http_request_seconds.observe(elapsed, path, str(response.status_code))
+    return response
+
+class PolicyFilter(BaseModel):
+    # Matched word by word, case-insensitively: {"insurer": "HDFC Ergo"} matches "HDFC ERGO General Insurance Co. Ltd."
+    insurer: Optional[str] = None
+    product: Optional[str] = None
+    doc_type: Optional[str] = None
+
 class QuestionRequest(BaseModel):
     question: str
+    filter: Optional[PolicyFilter] = None
 
 class AnswerResponse(BaseModel):
     answer: str
@@ -48,10 +104,51 @@ class AnswerResponse(BaseModel):
     retrieval_score: Optional[float] = None
     used_rag: bool
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    filter: Optional[PolicyFilter] = None
+
+class BatchAnswerItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sources: List[str] = []
+    retrieval_score: Optional[float] = None
+    used_rag: Optional[bool] = None
+    error: Optional[str] = None
+
+class BatchAnswerResponse(BaseModel):
+    results: List[BatchAnswerItem]
+
+class RollbackRequest(BaseModel):
+    # An archived version from GET /admin/index; the most recent one if omitted
+    version: Optional[str] = None
+
+# Limits for /ask/batch
+batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", 10000))
+batch_llm_concurrency = int(os.getenv("BATCH_LLM_CONCURRENCY", 8))
+# /admin endpoints are disabled unless a token is configured
+admin_token = os.getenv("ADMIN_TOKEN", "")
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize the RAG service for insurance on startup"""
-    await rag_service.initialize()
+    """Start initializing the RAG service in the background so the server accepts connections right away"""
+    app.state.initialization = asyncio.create_task(initialize_rag_service())
+
+async def initialize_rag_service():
+    try:
+        await rag_service.initialize()
+    except Exception as e:
+        # Reported by /health and /ready through rag_service.state
+        print(f"RAG service failed to initialize: {e}")
+        return
+    # Reindex changed policy files in the background (INDEX_WATCH_SECONDS)
+    app.state.database_watch = asyncio.create_task(rag_service.watch_database())
+
+def require_ready():
+    """Refuse questions with 503 until the model and index are loaded"""
+    if not rag_service.ready:
+        raise HTTPException(status_code=503, detail=f"Service is starting up ({rag_service.state})",
+                            headers={"Retry-After": "5"})
 
 @app.get("/")
 async def root():
@@ -60,48 +157,296 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    # Service health check
-    return {"status": "healthy", "service": "FinTell - your insurance companion"}
+    # Liveness: healthy while starting up too, unhealthy only if initialization failed
+    if rag_service.state == "failed":
+        return JSONResponse(status_code=503, content={
+            "status": "unhealthy", "service": "FinTell - your insurance companion",
+            "state": rag_service.state, "error": rag_service.init_error
+        })
+    return {"status": "healthy", "service": "FinTell - your insurance companion", "state": rag_service.state}
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: 200 only once questions can be answered, so load balancers hold traffic until then
+    body = {
+        "status": "ready" if rag_service.ready else "not_ready",
+        "state": rag_service.state,
+        "state_seconds": round(time.time() - rag_service.state_since, 1),
+    }
+    if not rag_service.ready:
+        if rag_service.init_error:
+            body["error"] = rag_service.init_error
+        return JSONResponse(status_code=503, content=body)
+    body.update(index_version=rag_service.index_version, chunks=len(rag_service.documents))
+    return body
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Prometheus scrape endpoint; with several uvicorn workers each process reports its own series
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def service_stats():
+    # Runtime tuning metrics
+    return {
+        "embedding_batcher": rag_service.query_batcher.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_scheduler": llm_service.scheduler.stats() if llm_service is not None else None,
+        "index_shards": rag_service.faiss_index.stats() if rag_service.faiss_index is not None else {}
+    }
+
+def require_admin(x_admin_token: Optional[str]):
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not secrets.compare_digest(x_admin_token or "", admin_token):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token header")
+
+@app.post("/admin/reindex")
+async def reindex(wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    # Index changed policy files beside the live index and swap it in; queries are served throughout
+    require_admin(x_admin_token)
+    require_ready()
+    if wait:
+        return await rag_service.reload_index("admin")
+    app.state.reload = asyncio.create_task(rag_service.reload_index("admin"))
+    return JSONResponse(status_code=202, content={"state": "started", "status_url": "/admin/index"})
+
+@app.get("/admin/index")
+async def index_status(x_admin_token: Optional[str] = Header(None)):
+    # Served and archived index versions and the outcome of the last reload
+    require_admin(x_admin_token)
+    return rag_service.index_status()
+
+@app.post("/admin/rollback")
+async def rollback_index(request: Optional[RollbackRequest] = None, x_admin_token: Optional[str] = Header(None)):
+    # Serve an archived index version again; the current one is archived so this can be undone
+    require_admin(x_admin_token)
+    require_ready()
+    try:
+        return await rag_service.rollback_index(request.version if request is not None else None)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def filter_fields(policy_filter: Optional[PolicyFilter]) -> Optional[Dict[str, str]]:
+    if policy_filter is None:
+        return None
+    return policy_filter.model_dump(exclude_none=True) or None
+
+async def lookup_answer(question: str, policy_filter: Optional[Dict[str, str]] = None) -> Tuple[Optional[dict], Optional[RetrievalResult], int]:
+    """Check the answer cache, retrieving policy context only when the exact question is not cached"""
+    # Cache hits skip retrieval (exact) or the LLM call (semantic); filtered questions are not cached
+    index_version = rag_service.index_version
+    cached = answer_cache.get_exact(question, index_version) if policy_filter is None else None
+    if cached is not None:
+        metrics.route_total.inc("cache_exact")
+        return cached, None, index_version
+    
+    with metrics.timed_stage("retrieve"):
+        retrieval_result = await rag_service.retrieve_documents(question, policy_filter)
+    if retrieval_result.embedding is not None and policy_filter is None:
+        cached = answer_cache.get_similar(retrieval_result.embedding, index_version)
+        if cached is not None:
+            metrics.route_total.inc("cache_semantic")
+    return cached, retrieval_result, index_version
+
+def uses_rag(retrieval_result: RetrievalResult) -> bool:
+    used_rag = retrieval_result.score >= float(os.getenv("RETRIEVAL_THRESHOLD", 0.7))
+    metrics.route_total.inc("rag" if used_rag else "fallback")
+    return used_rag
+
+def llm_unavailable(error: Exception) -> HTTPException:
+    """503 when the model queue is full (retry shortly), 504 when the request deadline passed"""
+    if isinstance(error, LLMOverloaded):
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
+    return HTTPException(status_code=504, detail=str(error))
+
+async def answer_from_retrieval(question: str, retrieval_result: RetrievalResult, index_version: int,
+                                deadline: Optional[float] = None, cacheable: bool = True) -> AnswerResponse:
+    """Route to the RAG or fallback prompt by retrieval score and cache successful answers"""
+    llm = get_llm_service()
+    if uses_rag(retrieval_result):
+        # Use RAG model with retrieved insurance policy context
+        answer = await llm.generate_rag_response(
+            question,
+            retrieval_result.context,
+            retrieval_result.sources,
+            deadline=deadline
+        )
+        response = AnswerResponse(
+            answer=answer,
+            sources=retrieval_result.sources,
+            retrieval_score=retrieval_result.score,
+            used_rag=True
+        )
+    else:
+        # Fallback to general insurance reasoning
+        answer = await llm.generate_fallback_response(question, deadline=deadline)
+        response = AnswerResponse(
+            answer=answer,
+            sources=[],
+            retrieval_score=retrieval_result.score,
+            used_rag=False
+        )
+    if cacheable and answer != llm_service_module.ERROR_MESSAGE:
+        answer_cache.put(question, retrieval_result.embedding, response.model_dump(), index_version)
+    return response
 
 @app.post("/ask", response_model=AnswerResponse)
 async def ask_insurance_question(request: QuestionRequest):
     """
     Process an insurance question using RAG or fallback to reasoning
     """
+    require_ready()
     try:
         question = request.question.strip()
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
-        retrieval_result = await rag_service.retrieve_documents(question)
-        retrieval_threshold = float(os.getenv("RETRIEVAL_THRESHOLD", 0.7))
-        
-        if retrieval_result.score >= retrieval_threshold:
-            # Use RAG model with retrieved insurance policy context
-            llm = get_llm_service()
-            answer = await llm.generate_rag_response(
-                question,
-                retrieval_result.context,
-                retrieval_result.sources
-            )
-            return AnswerResponse(
-                answer=answer,
-                sources=retrieval_result.sources,
-                retrieval_score=retrieval_result.score,
-                used_rag=True
-            )
+        # The LLM timeout counts from the request's arrival, not from when generation starts
+        deadline = get_llm_service().scheduler.deadline()
+        policy_filter = filter_fields(request.filter)
+        cached, retrieval_result, index_version = await lookup_answer(question, policy_filter)
+        if cached is not None:
+            return AnswerResponse(**cached)
+        return await answer_from_retrieval(question, retrieval_result, index_version, deadline,
+                                           cacheable=policy_filter is None)
+    except (LLMOverloaded, LLMDeadlineExceeded) as e:
+        raise llm_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+
+@app.post("/ask/batch", response_model=BatchAnswerResponse)
+async def ask_insurance_questions_batch(request: BatchQuestionRequest):
+    """
+    Answer many questions with one vectorized retrieval pass and bounded LLM concurrency.
+    Results are in input order; a failing question gets an error instead of failing the batch.
+    """
+    require_ready()
+    if len(request.questions) > batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"At most {batch_max_questions} questions per batch")
+    
+    index_version = rag_service.index_version
+    policy_filter = filter_fields(request.filter)
+    cacheable = policy_filter is None
+    results: List[Optional[BatchAnswerItem]] = [None] * len(request.questions)
+    pending = []
+    for position, raw_question in enumerate(request.questions):
+        question = raw_question.strip()
+        if not question:
+            results[position] = BatchAnswerItem(question=raw_question, error="Question cannot be empty")
+            continue
+        cached = answer_cache.get_exact(question, index_version) if cacheable else None
+        if cached is not None:
+            metrics.route_total.inc("cache_exact")
+            results[position] = BatchAnswerItem(question=raw_question, **cached)
         else:
-            # Fallback to general insurance reasoning
-            llm = get_llm_service()
-            answer = await llm.generate_fallback_response(question)
-            return AnswerResponse(
-                answer=answer,
-                sources=[],
-                retrieval_score=retrieval_result.score,
-                used_rag=False
-            )
+            pending.append((position, question))
+    
+    if not pending:
+        # Empty, blank or fully cached: nothing to retrieve
+        return BatchAnswerResponse(results=results)
+    try:
+        with metrics.timed_stage("retrieve_batch"):
+            retrievals = await rag_service.retrieve_documents_batch([question for _, question in pending], policy_filter)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving policy context: {str(e)}")
+    
+    llm_slots = asyncio.Semaphore(batch_llm_concurrency)
+    
+    async def answer_one(position: int, question: str, retrieval_result: RetrievalResult):
+        raw_question = request.questions[position]
+        try:
+            cached = None
+            if retrieval_result.embedding is not None and cacheable:
+                cached = answer_cache.get_similar(retrieval_result.embedding, index_version)
+            if cached is not None:
+                metrics.route_total.inc("cache_semantic")
+                response = AnswerResponse(**cached)
+            else:
+                async with llm_slots:
+                    # Each question gets the full LLM timeout from when its slot frees up, so long batches
+                    # are not cut off by a deadline counted from the request's arrival
+                    deadline = get_llm_service().scheduler.deadline()
+                    response = await answer_from_retrieval(question, retrieval_result, index_version, deadline, cacheable)
+                if response.answer == llm_service_module.ERROR_MESSAGE:
+                    results[position] = BatchAnswerItem(question=raw_question, error=response.answer)
+                    return
+            results[position] = BatchAnswerItem(question=raw_question, **response.model_dump())
+        except Exception as e:
+            results[position] = BatchAnswerItem(question=raw_question, error=f"Error processing question: {str(e)}")
+    
+    await asyncio.gather(*(
+        answer_one(position, question, retrieval_result)
+        for (position, question), retrieval_result in zip(pending, retrievals)
+    ))
+    return BatchAnswerResponse(results=results)
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_insurance_question_stream(request: QuestionRequest):
+    """
+    Stream an answer as Server-Sent Events: a metadata event with sources and
+    retrieval score, token events as the model produces text, then done
+    """
+    require_ready()
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    llm = get_llm_service()
+    if llm.scheduler.saturated():
+        # Reject before the 200 and event stream start rather than failing mid-stream
+        raise llm_unavailable(LLMOverloaded("LLM service is at capacity, please retry shortly"))
+    deadline = llm.scheduler.deadline()
+    policy_filter = filter_fields(request.filter)
+    try:
+        cached, retrieval_result, index_version = await lookup_answer(question, policy_filter)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+    
+    async def events():
+        if cached is not None:
+            yield sse_event("metadata", {key: value for key, value in cached.items() if key != "answer"})
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {})
+            return
+        
+        used_rag = uses_rag(retrieval_result)
+        sources = retrieval_result.sources if used_rag else []
+        yield sse_event("metadata", {
+            "sources": sources,
+            "retrieval_score": retrieval_result.score,
+            "used_rag": used_rag
+        })
+        parts = []
+        try:
+            if used_rag:
+                stream = llm.stream_rag_response(question, retrieval_result.context, sources, deadline=deadline)
+            else:
+                stream = llm.stream_fallback_response(question, deadline=deadline)
+            async for text in stream:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield sse_event("error", {"detail": llm_service_module.ERROR_MESSAGE})
+            return
+        yield sse_event("done", {})
+        if policy_filter is not None:
+            return
+        answer_cache.put(question, retrieval_result.embedding, {
+            "answer": "".join(parts).strip(),
+            "sources": sources,
+            "retrieval_score": retrieval_result.score,
+            "used_rag": used_rag
+        }, index_version)
+    
+    # Disable proxy buffering so tokens reach the client as they are produced
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == "__main__":
     import uvicorn
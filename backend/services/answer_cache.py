@@ -0,0 +1,145 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive cache key"""
+    return re.sub(r"\s+", " ", question.lower()).strip(" ?!.")
+
+
+class SemanticAnswerCache:
+    """LRU + TTL cache of /ask answers keyed on normalized question text and query-embedding similarity.
+
+    Exact lookups need only the question; semantic lookups compare the query
+    embedding against all cached questions with one matrix-vector product.
+    Entries are tied to the index version they were answered against and the
+    whole cache is dropped when the index is rebuilt.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95, max_bytes: int = 50 * 2 ** 20):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_bytes = max_bytes
+        self.enabled = max_entries > 0
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._embeddings: Optional[np.ndarray] = None  # (max_entries, dim), one row per slot
+        self._slot_keys: list = [None] * max(0, max_entries)
+        self._free_slots = list(range(max(0, max_entries) - 1, -1, -1))
+        self._bytes = 0
+        self._index_version = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync_version(self, index_version: Any):
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self.clear()
+            self._index_version = index_version
+
+    def clear(self):
+        self._entries.clear()
+        self._slot_keys = [None] * max(0, self.max_entries)
+        self._free_slots = list(range(max(0, self.max_entries) - 1, -1, -1))
+        self._bytes = 0
+
+    def get_exact(self, question: str, index_version: Any) -> Optional[Dict[str, Any]]:
+        """Cached answer for the same normalized question, without needing an embedding"""
+        if not self.enabled:
+            return None
+        self._sync_version(index_version)
+        entry = self._live_entry(normalize_question(question))
+        if entry is None:
+            return None
+        self.exact_hits += 1
+        return entry["answer"]
+
+    def get_similar(self, embedding: np.ndarray, index_version: Any) -> Optional[Dict[str, Any]]:
+        """Cached answer for the most similar question above the similarity threshold"""
+        if not self.enabled:
+            return None
+        self._sync_version(index_version)
+        if self._embeddings is None or not self._entries:
+            self.misses += 1
+            return None
+        similarities = self._embeddings @ embedding.astype('float32').ravel()
+        for slot in np.argsort(-similarities):
+            if similarities[slot] < self.similarity_threshold:
+                break
+            key = self._slot_keys[slot]
+            if key is None:
+                continue
+            entry = self._live_entry(key)
+            if entry is not None:
+                self.semantic_hits += 1
+                return entry["answer"]
+        self.misses += 1
+        return None
+
+    def put(self, question: str, embedding: Optional[np.ndarray], answer: Dict[str, Any], index_version: Any):
+        if not self.enabled:
+            return
+        self._sync_version(index_version)
+        key = normalize_question(question)
+        if key in self._entries:
+            self._remove(key)
+        size = len(key) + len(str(answer))
+        if size > self.max_bytes:
+            return
+        while self._entries and (len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+        slot = None
+        if embedding is not None:
+            vector = embedding.astype('float32').ravel()
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, vector.shape[0]), dtype='float32')
+            slot = self._free_slots.pop()
+            self._embeddings[slot] = vector
+            self._slot_keys[slot] = key
+        self._entries[key] = {"answer": answer, "expires": time.monotonic() + self.ttl, "slot": slot, "size": size}
+        self._bytes += size
+
+    def _live_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        if entry["slot"] is not None:
+            self._embeddings[entry["slot"]] = 0.0
+            self._slot_keys[entry["slot"]] = None
+            self._free_slots.append(entry["slot"])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
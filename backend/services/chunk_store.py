@@ -0,0 +1,234 @@
+import bisect
+import json
+import mmap
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .policy_metadata import FACETS
+
+# On-disk layout inside the index directory
+TEXT_FILE = "chunks.bin"          # UTF-8 chunk texts, back to back
+OFFSETS_FILE = "chunk_offsets.npy"  # int64[n + 1] byte offsets into TEXT_FILE
+IDS_FILE = "chunk_ids.npy"        # int64[n] FAISS IDs, strictly increasing
+SOURCES_FILE = "chunk_sources.npy"  # int32[n] index into SOURCE_NAMES_FILE
+NUMBERS_FILE = "chunk_numbers.npy"  # int32[n] position of the chunk within its document
+SOURCE_NAMES_FILE = "sources.json"  # interned source names
+REF_OFFSETS_FILE = "chunk_ref_offsets.npy"  # int64[n + 1] slices into REF_SOURCES_FILE
+REF_SOURCES_FILE = "chunk_ref_sources.npy"  # int32 additional sources of near-duplicate chunks
+FACETS_FILE = "chunk_facets.npy"  # int32[n, len(FACETS)] index into FACET_VALUES_FILE, -1 if unknown
+FACET_VALUES_FILE = "facet_values.json"  # interned insurer / product / document type values
+
+STORE_FILES = (TEXT_FILE, OFFSETS_FILE, IDS_FILE, SOURCES_FILE, NUMBERS_FILE, SOURCE_NAMES_FILE,
+               REF_OFFSETS_FILE, REF_SOURCES_FILE, FACETS_FILE, FACET_VALUES_FILE)
+
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk texts and metadata looked up by FAISS ID.
+
+    Only the arrays' pages touched by a lookup are read, and the pages are
+    shared between processes (uvicorn workers) mapping the same files.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._blob = None
+        self._text = b""
+        self.ids = np.empty(0, dtype='int64')
+        self.offsets = np.zeros(1, dtype='int64')
+        self.source_ids = np.empty(0, dtype='int32')
+        self.chunk_numbers = np.empty(0, dtype='int32')
+        self.ref_offsets = np.zeros(1, dtype='int64')
+        self.ref_sources = np.empty(0, dtype='int32')
+        self.facets = np.empty((0, len(FACETS)), dtype='int32')
+        self.sources: List[str] = []
+        self.facet_values: List[str] = []
+        if directory is not None:
+            self._open(Path(directory))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all((Path(directory) / name).exists() for name in STORE_FILES)
+
+    def _open(self, directory: Path):
+        self.ids = np.load(directory / IDS_FILE, mmap_mode='r')
+        self.offsets = np.load(directory / OFFSETS_FILE, mmap_mode='r')
+        self.source_ids = np.load(directory / SOURCES_FILE, mmap_mode='r')
+        self.chunk_numbers = np.load(directory / NUMBERS_FILE, mmap_mode='r')
+        self.ref_offsets = np.load(directory / REF_OFFSETS_FILE, mmap_mode='r')
+        self.ref_sources = np.load(directory / REF_SOURCES_FILE, mmap_mode='r')
+        self.facets = np.load(directory / FACETS_FILE, mmap_mode='r')
+        with open(directory / SOURCE_NAMES_FILE, 'r', encoding='utf-8') as f:
+            self.sources = json.load(f)
+        with open(directory / FACET_VALUES_FILE, 'r', encoding='utf-8') as f:
+            self.facet_values = json.load(f)
+        if int(self.offsets[-1]) > 0:
+            with open(directory / TEXT_FILE, 'rb') as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._text = self._blob
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._row(chunk_id) is not None
+
+    def _row(self, chunk_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, chunk_id))
+        if row < len(self.ids) and int(self.ids[row]) == chunk_id:
+            return row
+        return None
+
+    def get(self, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """Chunk metadata and content for a FAISS ID, or None if it is not stored"""
+        row = self._row(chunk_id)
+        if row is None:
+            return None
+        return self._record(row)
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        source = self.sources[int(self.source_ids[row])]
+        ref_start, ref_end = int(self.ref_offsets[row]), int(self.ref_offsets[row + 1])
+        record = {
+            "source": source,
+            # Near-duplicate chunks collapsed into this one keep their own sources here
+            "sources": [source] + [self.sources[int(ref)] for ref in self.ref_sources[ref_start:ref_end]],
+            "chunk_id": int(self.chunk_numbers[row]),
+            "content": self._text[start:end].decode('utf-8')
+        }
+        for column, facet in enumerate(FACETS):
+            value = int(self.facets[row, column])
+            record[facet] = self.facet_values[value] if value >= 0 else None
+        return record
+
+    def facet_mask(self, facet: str, matches: Callable[[str], bool]) -> np.ndarray:
+        """Boolean row mask of chunks whose value of an insurer / product / doc_type facet matches"""
+        value_ids = [value_id for value_id, value in enumerate(self.facet_values) if matches(value)]
+        return np.isin(self.facets[:, FACETS.index(facet)], np.array(value_ids, dtype='int32'))
+
+    def facet_counts(self, facet: str) -> Dict[str, int]:
+        """Chunks per value of a facet; chunks whose value is unknown are counted under the empty string"""
+        value_ids, counts = np.unique(self.facets[:, FACETS.index(facet)], return_counts=True)
+        return {self.facet_values[value_id] if value_id >= 0 else "": int(count)
+                for value_id, count in zip(value_ids.tolist(), counts.tolist())}
+
+    def items(self, skip_ids: Optional[set] = None, start_id: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Stream (FAISS ID, record) pairs in ID order, from start_id on"""
+        first_row = int(np.searchsorted(self.ids, start_id))
+        for row, chunk_id in enumerate(self.ids[first_row:].tolist(), start=first_row):
+            if skip_ids and chunk_id in skip_ids:
+                continue
+            yield chunk_id, self._record(row)
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+            self._text = b""
+
+
+class ChunkStoreWriter:
+    """Streams chunks to a new store; files are moved into place on checkpoint() or close()"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._text_file = open(self._tmp(TEXT_FILE), 'wb')
+        self._position = 0
+        # Compact typed arrays keep per-chunk bookkeeping small for very large stores
+        self._offsets = array('q', [0])
+        self._ids = array('q')
+        self._source_ids = array('i')
+        self._chunk_numbers = array('i')
+        self._facets = array('i')
+        # Extra sources per row; kept sparse so sources can still be linked to rows already written
+        self._refs: Dict[int, List[int]] = {}
+        self._source_index: Dict[str, int] = {}
+        self._facet_index: Dict[str, int] = {}
+        self._text_in_place = False
+
+    def _tmp(self, name: str) -> Path:
+        return self.directory / f"{name}.tmp"
+
+    def append(self, chunk_id: int, record: Dict[str, Any]):
+        if self._ids and chunk_id <= self._ids[-1]:
+            raise ValueError(f"Chunk IDs must be appended in increasing order ({chunk_id} after {self._ids[-1]})")
+        data = record["content"].encode('utf-8')
+        self._text_file.write(data)
+        self._position += len(data)
+        self._offsets.append(self._position)
+        self._ids.append(chunk_id)
+        self._source_ids.append(self._source_index.setdefault(record["source"], len(self._source_index)))
+        self._chunk_numbers.append(record["chunk_id"])
+        for facet in FACETS:
+            value = record.get(facet)
+            self._facets.append(self._facet_index.setdefault(value, len(self._facet_index)) if value else -1)
+        if len(record.get("sources", [])) > 1:
+            self._refs[len(self._ids) - 1] = [self._source_index.setdefault(source, len(self._source_index))
+                                              for source in record["sources"][1:]]
+
+    def link_sources(self, chunk_id: int, sources: List[str]):
+        """Add sources of a near-duplicate to a chunk that was already appended"""
+        row = bisect.bisect_left(self._ids, chunk_id)
+        if row == len(self._ids) or self._ids[row] != chunk_id:
+            raise KeyError(chunk_id)
+        primary = self._source_ids[row]
+        refs = self._refs.setdefault(row, [])
+        for source in sources:
+            source_id = self._source_index.setdefault(source, len(self._source_index))
+            if source_id != primary and source_id not in refs:
+                refs.append(source_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _write_arrays(self):
+        ref_offsets = np.zeros(len(self._ids) + 1, dtype='int64')
+        for row, refs in self._refs.items():
+            ref_offsets[row + 1] = len(refs)
+        np.cumsum(ref_offsets, out=ref_offsets)
+        ref_sources = np.empty(int(ref_offsets[-1]), dtype='int32')
+        for row, refs in self._refs.items():
+            ref_sources[ref_offsets[row]:ref_offsets[row + 1]] = refs
+        arrays = {
+            OFFSETS_FILE: np.frombuffer(self._offsets, dtype='int64'),
+            IDS_FILE: np.frombuffer(self._ids, dtype='int64'),
+            SOURCES_FILE: np.frombuffer(self._source_ids, dtype='int32'),
+            NUMBERS_FILE: np.frombuffer(self._chunk_numbers, dtype='int32'),
+            REF_OFFSETS_FILE: ref_offsets,
+            REF_SOURCES_FILE: ref_sources,
+            FACETS_FILE: np.frombuffer(self._facets, dtype='int32').reshape(-1, len(FACETS)),
+        }
+        for name, values in arrays.items():
+            with open(self._tmp(name), 'wb') as f:
+                np.save(f, values)
+        with open(self._tmp(SOURCE_NAMES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(list(self._source_index), f)
+        with open(self._tmp(FACET_VALUES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(list(self._facet_index), f)
+        # Readers that still map the old files keep their pages; new readers see the new store
+        for name in STORE_FILES:
+            if name == TEXT_FILE and self._text_in_place:
+                continue
+            os.replace(self._tmp(name), self.directory / name)
+        self._text_in_place = True
+
+    def checkpoint(self):
+        """Make everything appended so far a complete store on disk and keep writing.
+
+        The text file is moved into place once and appended to from then on;
+        bytes past the last offset are invisible to readers.
+        """
+        self._text_file.flush()
+        os.fsync(self._text_file.fileno())
+        self._write_arrays()
+
+    def close(self) -> ChunkStore:
+        """Finish writing, atomically replace the previous store and open the new one"""
+        self._text_file.close()
+        self._write_arrays()
+        return ChunkStore(str(self.directory))
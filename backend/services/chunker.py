@@ -0,0 +1,128 @@
+import re
+from typing import Any, List, Optional
+
+# Lines that open a new policy section or clause: "SECTION 4", "Clause 3.2", "4.1.2 Waiting Period",
+# "(a) ...", "ii) ...", or short all-caps headings such as "EXCLUSIONS"
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:"
+    r"(?i:section|clause|article|part|schedule|annexure|chapter)\b[\s.:-]*[\w.()-]*"
+    r"|\d+(?:\.\d+)*[.)]?\s+\S"
+    r"|\(?(?:[a-z]|[ivx]{1,4})\)\s+\S"
+    r"|[A-Z][A-Z0-9 &/,'()-]{3,80}$"
+    r")"
+)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.;:?!])\s+(?=[A-Z0-9(])")
+
+
+class StructuredChunker:
+    """Splits policy text at section and clause boundaries into chunks that fit the embedding model.
+
+    Text is cut into sections at heading/clause lines, and sections are packed
+    into chunks of at most max_tokens tokens as counted by the model's own
+    tokenizer, so nothing is silently truncated at encode time. Oversized
+    sections fall back to paragraph, sentence and finally word boundaries.
+    """
+
+    def __init__(self, tokenizer: Optional[Any] = None, max_tokens: int = 254, overlap_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 4)
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            # Roughly 1.3 word pieces per English word for WordPiece vocabularies
+            return max(1, round(len(text.split()) * 1.3))
+        return len(self.tokenizer.tokenize(text))
+
+    def chunk(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for section in self._sections(text):
+            section_tokens = self.count_tokens(section)
+            if section_tokens > self.max_tokens:
+                if current:
+                    chunks.append("\n".join(current))
+                    current, current_tokens = [], 0
+                chunks.extend(self._split_section(section))
+                continue
+            # Start a new chunk at a heading rather than splitting a clause across two chunks
+            if current and current_tokens + section_tokens > self.max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(section)
+            current_tokens += section_tokens
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def _sections(self, text: str) -> List[str]:
+        sections: List[str] = []
+        lines: List[str] = []
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                if lines and lines[-1] != "":
+                    lines.append("")  # keep paragraph breaks for the fallback splitter
+                continue
+            if lines and HEADING_PATTERN.match(stripped):
+                sections.append("\n".join(lines).strip())
+                lines = []
+            lines.append(re.sub(r"\s+", " ", stripped))
+        if lines:
+            sections.append("\n".join(lines).strip())
+        return [section for section in sections if section]
+
+    def _split_section(self, section: str) -> List[str]:
+        """Pack paragraphs, then sentences, then word windows of one long section, with overlap"""
+        pieces: List[str] = []
+        for paragraph in section.split("\n\n"):
+            if self.count_tokens(paragraph) <= self.max_tokens:
+                pieces.append(paragraph)
+                continue
+            for sentence in SENTENCE_BOUNDARY.split(paragraph):
+                if self.count_tokens(sentence) <= self.max_tokens:
+                    pieces.append(sentence)
+                else:
+                    pieces.extend(self._split_words(sentence))
+
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for piece in pieces:
+            piece_tokens = self.count_tokens(piece)
+            if current and current_tokens + piece_tokens > self.max_tokens:
+                chunks.append(" ".join(current))
+                # Carry trailing pieces forward so a clause split mid-way keeps some context
+                carried: List[str] = []
+                carried_tokens = 0
+                for previous in reversed(current):
+                    previous_tokens = self.count_tokens(previous)
+                    if carried_tokens + previous_tokens > self.overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous_tokens
+                current, current_tokens = carried, carried_tokens
+                if current_tokens + piece_tokens > self.max_tokens:
+                    current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def _split_words(self, text: str) -> List[str]:
+        """Last resort for run-on text: greedy word windows within the token budget"""
+        windows: List[str] = []
+        words: List[str] = []
+        tokens = 0
+        for word in text.split():
+            word_tokens = self.count_tokens(word)
+            if words and tokens + word_tokens > self.max_tokens:
+                windows.append(" ".join(words))
+                words, tokens = [], 0
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            windows.append(" ".join(words))
+        return windows
@@ -0,0 +1,73 @@
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import context_chunks, context_tokens
+
+
+class ContextAssembler:
+    """Chooses the retrieved chunks that go into the prompt: MMR reranking, then packing to a token budget.
+
+    Maximal marginal relevance trades a chunk's similarity to the question
+    against its similarity to chunks already chosen, so overlapping windows
+    of one clause do not crowd out other evidence. Chunks nearly identical
+    to a chosen one are dropped outright, and the rest are added in MMR order
+    while they fit in ``token_budget`` tokens.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], token_budget: int = 1500,
+                 mmr_lambda: float = 0.7, redundancy_threshold: float = 0.95):
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.redundancy_threshold = redundancy_threshold
+
+    def order(self, query_embedding: np.ndarray, vectors: np.ndarray) -> Tuple[List[int], List[int]]:
+        """Candidate positions in MMR order, and the positions dropped as redundant"""
+        relevance = vectors @ query_embedding
+        similarity = vectors @ vectors.T
+        remaining = list(range(len(vectors)))
+        ordered: List[int] = []
+        redundant: List[int] = []
+        while remaining:
+            if ordered:
+                closest = similarity[np.ix_(remaining, ordered)].max(axis=1)
+            else:
+                closest = np.zeros(len(remaining), dtype='float32')
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * closest
+            best = int(np.argmax(scores))
+            position = remaining.pop(best)
+            if closest[best] >= self.redundancy_threshold:
+                redundant.append(position)
+            else:
+                ordered.append(position)
+        return ordered, redundant
+
+    def assemble(self, texts: Sequence[str], query_embedding: Optional[np.ndarray] = None,
+                 vectors: Optional[np.ndarray] = None) -> Tuple[List[int], int]:
+        """Positions of the texts to include, in prompt order, and the tokens they use.
+
+        Without vectors the retrieval order is kept and only the budget applies.
+        The best chunk is always included, even if it alone exceeds the budget.
+        """
+        if query_embedding is not None and vectors is not None and len(texts) > 1:
+            ordered, redundant = self.order(query_embedding, vectors)
+        else:
+            ordered, redundant = list(range(len(texts))), []
+        selected: List[int] = []
+        used = 0
+        over_budget = 0
+        for position in ordered:
+            tokens = self.count_tokens(texts[position])
+            if selected and used + tokens > self.token_budget:
+                over_budget += 1
+                continue
+            selected.append(position)
+            used += tokens
+        context_chunks.inc("included", amount=len(selected))
+        if redundant:
+            context_chunks.inc("redundant", amount=len(redundant))
+        if over_budget:
+            context_chunks.inc("over_budget", amount=over_budget)
+        context_tokens.observe(used)
+        return selected, used
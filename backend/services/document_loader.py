@@ -1,50 +1,185 @@
 import os
 import json
+import signal
 import asyncio
-from typing import List, Dict, Any
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, List, Dict, Any, Optional
 from pathlib import Path
-import PyPDF2
-from docx import Document
+
+from .policy_metadata import extract_metadata
+
+def _report_worker_pid(pids):
+    """Pool initializer: record the worker's pid so a hung parse can be terminated"""
+    pids.put(os.getpid())
 
 class DocumentLoader:
     def __init__(self):
         # Supported extensions for insurance policy sources
         self.supported_extensions = {'.txt', '.pdf', '.docx', '.json'}
+        # Files in a subfolder of the database directory take the folder name as their insurer
+        self.database_path = os.getenv("DATABASE_PATH", "./database")
+        # Parallel ingestion: number of parser processes (1 parses in-process) and per-file timeout in seconds
+        self.workers = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+        self.file_timeout = float(os.getenv("INGEST_FILE_TIMEOUT", 300))
+        # Files parsed ahead of the consumer when streaming (0 = twice the worker count)
+        self.prefetch = int(os.getenv("INGEST_PREFETCH", 0)) or 2 * max(1, self.workers)
     
     async def load_all_documents(self, database_path: str) -> List[Dict[str, Any]]:
         """Load all insurance policy documents from the database directory"""
         documents = []
+        for file_documents in await self.load_files(self.list_document_files(database_path)):
+            documents.extend(file_documents or [])
+        print(f"Loaded {len(documents)} insurance policy documents from database")
+        return documents
+    
+    async def load_files(self, file_paths: List[Path]) -> List[Optional[List[Dict[str, Any]]]]:
+        """Parse files in a process pool; results are returned in the order of file_paths"""
+        return [documents async for documents in self.iter_files(file_paths)]
+    
+    async def iter_files(self, file_paths: List[Path]) -> AsyncIterator[Optional[List[Dict[str, Any]]]]:
+        """Parse files in a process pool and yield each file's documents in the order of file_paths.
+        
+        At most ``prefetch`` files are in flight or waiting to be consumed, so a
+        slow consumer (embedding) holds back parsing instead of buffering the corpus.
+        A file whose parse timed out or whose worker failed yields None rather
+        than [] (no content), so callers can try it again later.
+        """
+        if self.workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                yield await self.load_file(file_path)
+            return
+        
+        loop = asyncio.get_running_loop()
+        # Bound dispatch to the pool size so each file's timeout covers its parse, not its queue wait
+        dispatch = asyncio.Semaphore(self.workers)
+        context = multiprocessing.get_context()
+        max_workers = min(self.workers, len(file_paths))
+        
+        def new_pool() -> ProcessPoolExecutor:
+            # Workers report their pid so a pool holding a hung parse can be terminated
+            pids = context.SimpleQueue()
+            new = ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                      initializer=_report_worker_pid, initargs=(pids,))
+            worker_pids[new] = pids
+            return new
+        
+        def terminate(stale: ProcessPoolExecutor):
+            pids = worker_pids.pop(stale)
+            while not pids.empty():
+                try:
+                    os.kill(pids.get(), signal.SIGTERM)
+                except OSError:
+                    pass
+            stale.shutdown(wait=False, cancel_futures=True)
+        
+        def recycle(broken: ProcessPoolExecutor):
+            """Replace the pool once, however many of its files failed with it"""
+            nonlocal pool
+            if broken is pool:
+                terminate(broken)
+                pool = new_pool()
+        
+        async def load_in_pool(file_path: Path) -> Optional[List[Dict[str, Any]]]:
+            async with dispatch:
+                # A file whose pool was torn down because another file hung or crashed gets one more try
+                for attempt in range(2):
+                    current = pool
+                    try:
+                        return await asyncio.wait_for(
+                            loop.run_in_executor(current, self.parse_file, file_path),
+                            timeout=self.file_timeout
+                        )
+                    except asyncio.TimeoutError:
+                        # The stuck worker cannot be cancelled; without a fresh pool it would
+                        # keep its slot and later files would time out queued behind it
+                        print(f"Timed out after {self.file_timeout}s loading {file_path}")
+                        recycle(current)
+                    except BrokenProcessPool as e:
+                        recycle(current)
+                        if attempt == 0:
+                            continue
+                        print(f"Error loading {file_path}: {e}")
+                    except Exception as e:
+                        print(f"Error loading {file_path}: {e}")
+                    return None
+        
+        worker_pids = {}
+        pool = new_pool()
+        remaining = iter(file_paths)
+        window = deque()
+        try:
+            for file_path in remaining:
+                window.append(asyncio.ensure_future(load_in_pool(file_path)))
+                if len(window) >= self.prefetch:
+                    break
+            while window:
+                documents = await window.popleft()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    window.append(asyncio.ensure_future(load_in_pool(next_path)))
+                yield documents
+        finally:
+            for task in window:
+                task.cancel()
+            if window:
+                # Closed early: parses still running may never finish
+                terminate(pool)
+            else:
+                pool.shutdown(wait=True)
+    
+    def list_document_files(self, database_path: str, exclude: Optional[List[str]] = None) -> List[Path]:
+        """List supported policy files, Final_Dataset.json first, then the rest in sorted order"""
         database_dir = Path(database_path)
         if not database_dir.exists():
             print(f"Database directory {database_path} does not exist")
-            return documents
+            return []
+        excluded_dirs = [Path(p).resolve() for p in (exclude or [])]
         
-        # Prioritize loading Final_Dataset.json if it exists
-        final_dataset_path = database_dir / "Final_Dataset.json"
-        if final_dataset_path.exists():
-            json_docs = await self._load_json_dataset(final_dataset_path)
-            documents.extend(json_docs)
-        
-        # Then load individual files for insurance policy content
-        for file_path in database_dir.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions:
-                if file_path.name == "Final_Dataset.json":
-                    continue  # Already processed
-                try:
-                    content = await self._load_single_document(file_path)
-                    if content:
-                        documents.append({
-                            "source": file_path.name,
-                            "content": content,
-                            "file_path": str(file_path)
-                        })
-                except Exception as e:
-                    print(f"Error loading {file_path}: {e}")
+        files = []
+        for file_path in sorted(database_dir.rglob("*")):
+            if not file_path.is_file() or file_path.suffix.lower() not in self.supported_extensions:
+                continue
+            resolved = file_path.resolve()
+            if any(excluded in resolved.parents for excluded in excluded_dirs):
+                continue  # Skip index artifacts stored under the database directory
+            files.append(file_path)
         
-        print(f"Loaded {len(documents)} insurance policy documents from database")
-        return documents
+        # Prioritize loading Final_Dataset.json if it exists
+        files.sort(key=lambda path: path.name != "Final_Dataset.json")
+        return files
+    
+    async def load_file(self, file_path: Path) -> List[Dict[str, Any]]:
+        """Load the insurance policy documents contained in a single file off the event loop"""
+        return await asyncio.to_thread(self.parse_file, file_path)
+    
+    def source_name(self, file_path: Path) -> str:
+        """How answers cite a file: its path under the database directory, so same-named files stay apart"""
+        try:
+            return Path(file_path).resolve().relative_to(Path(self.database_path).resolve()).as_posix()
+        except ValueError:
+            return Path(file_path).name
+    
+    def parse_file(self, file_path: Path) -> List[Dict[str, Any]]:
+        """Parse a single file into insurance policy documents (blocking, safe to run in a worker process)"""
+        if file_path.name == "Final_Dataset.json":
+            return self._load_json_dataset(file_path)
+        try:
+            content = self._load_single_document(file_path)
+            if content:
+                return [{
+                    "source": self.source_name(file_path),
+                    "content": content,
+                    "file_path": str(file_path),
+                    **extract_metadata(file_path, content, self.database_path)
+                }]
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+        return []
     
-    async def _load_json_dataset(self, file_path: Path) -> List[Dict[str, Any]]:
+    def _load_json_dataset(self, file_path: Path) -> List[Dict[str, Any]]:
         """Load insurance documents from Final_Dataset.json"""
         documents = []
         try:
@@ -57,17 +192,19 @@ class DocumentLoader:
                     content = self._extract_content_from_json_item(item)
                     if content:
                         documents.append({
-                            "source": f"Final_Dataset.json (item {i+1})",
+                            "source": f"{self.source_name(file_path)} (item {i+1})",
                             "content": content,
-                            "file_path": str(file_path)
+                            "file_path": str(file_path),
+                            **extract_metadata(file_path, content, self.database_path, item)
                         })
             elif isinstance(data, dict):
                 content = self._extract_content_from_json_item(data)
                 if content:
                     documents.append({
-                        "source": "Final_Dataset.json",
+                        "source": self.source_name(file_path),
                         "content": content,
-                        "file_path": str(file_path)
+                        "file_path": str(file_path),
+                        **extract_metadata(file_path, content, self.database_path, data)
                     })
         except Exception as e:
             print(f"Error loading JSON dataset: {e}")
@@ -97,21 +234,21 @@ class DocumentLoader:
         else:
             return str(item)
     
-    async def _load_single_document(self, file_path: Path) -> str:
+    def _load_single_document(self, file_path: Path) -> str:
         """Load a single insurance policy document based on its file type"""
         extension = file_path.suffix.lower()
         if extension == '.txt':
-            return await self._load_txt_file(file_path)
+            return self._load_txt_file(file_path)
         elif extension == '.pdf':
-            return await self._load_pdf_file(file_path)
+            return self._load_pdf_file(file_path)
         elif extension == '.docx':
-            return await self._load_docx_file(file_path)
+            return self._load_docx_file(file_path)
         elif extension == '.json':
-            docs = await self._load_json_dataset(file_path)
+            docs = self._load_json_dataset(file_path)
             return "\n\n".join(doc["content"] for doc in docs)
         return ""
     
-    async def _load_txt_file(self, file_path: Path) -> str:
+    def _load_txt_file(self, file_path: Path) -> str:
         """Load insurance policy from text file"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -120,25 +257,29 @@ class DocumentLoader:
             with open(file_path, 'r', encoding='latin-1') as f:
                 return f.read()
     
-    async def _load_pdf_file(self, file_path: Path) -> str:
+    def _load_pdf_file(self, file_path: Path) -> str:
         """Load insurance policy from PDF file"""
-        text = ""
+        # Parser libraries are imported on first use to keep them off the app's import path
+        import PyPDF2
+        pages = []
         try:
             with open(file_path, 'rb') as f:
                 pdf_reader = PyPDF2.PdfReader(f)
+                # Collect pages and join once; repeated += copies the whole text for every page
                 for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                    pages.append(page.extract_text() or "")
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
-        return text.strip()
+        return "\n".join(pages).strip()
     
-    async def _load_docx_file(self, file_path: Path) -> str:
+    def _load_docx_file(self, file_path: Path) -> str:
         """Load insurance policy from DOCX file"""
-        text = ""
+        from docx import Document
+        paragraphs = []
         try:
             doc = Document(file_path)
             for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+                paragraphs.append(paragraph.text)
         except Exception as e:
             print(f"Error reading DOCX {file_path}: {e}")
-        return text.strip()
+        return "\n".join(paragraphs).strip()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent queries into one encode + search call run off the event loop.
+
+    Queries arriving within ``window_ms`` of the first pending query (or until
+    ``max_batch_size`` is reached) are handed to ``process_batch`` together,
+    which must return one result per query in the same order.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Sequence[Any]],
+                 window_ms: float = 5.0, max_batch_size: int = 32):
+        self.process_batch = process_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        # A single worker keeps batches serialized; queries queue up (and batch) while one runs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batcher")
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Tuning metrics
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.total_queue_wait = 0.0
+        self._recent_waits = deque(maxlen=1000)
+        self._recent_sizes = deque(maxlen=1000)
+
+    async def submit(self, query: Any) -> Any:
+        """Queue a query and wait for its result from the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        asyncio.get_running_loop().create_task(self._run_batch(batch))
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    async def _run_batch(self, batch: List[tuple]):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            wait = started - enqueued
+            self.total_queue_wait += wait
+            self._recent_waits.append(wait)
+        self.batches += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self._recent_sizes.append(len(batch))
+
+        queries = [query for query, _, _ in batch]
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self._executor, self.process_batch, queries)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait metrics for tuning the window against tail latency"""
+        waits = sorted(self._recent_waits)
+
+        def wait_percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "queries": self.queries,
+            "pending": len(self._pending),
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "recent_avg_batch_size": sum(self._recent_sizes) / len(self._recent_sizes) if self._recent_sizes else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_queue_wait_ms": self.total_queue_wait / self.queries * 1000 if self.queries else 0.0,
+            "p50_queue_wait_ms": wait_percentile(0.50),
+            "p99_queue_wait_ms": wait_percentile(0.99),
+        }
@@ -0,0 +1,200 @@
+"""Persistent, content-addressed cache of chunk embeddings.
+
+Usage (from the repository root):
+    python -m backend.services.embedding_cache stats
+    python -m backend.services.embedding_cache prune --max-entries 500000
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.bin"    # (capacity, dim) rows of DTYPE, memory-mapped
+KEYS_FILE = "keys.npy"          # S20[count] sha1 of (model name, chunk text), row-aligned with VECTORS_FILE
+LAST_USED_FILE = "last_used.npy"  # float64[count] unix time each row was last read or written
+META_FILE = "meta.json"
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha1(model_name.encode('utf-8') + b"\0" + text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """Embeddings keyed by (embedding model, chunk text hash) in a memory-mapped vector file.
+
+    Rows are appended as misses are stored; flush() persists the key index and
+    evicts least-recently-used rows once the cache holds more than max_entries.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 2_000_000, dtype: str = "float16"):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._keys: List[bytes] = []
+        self._rows: Dict[bytes, int] = {}
+        self._last_used = np.empty(0, dtype='float64')
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        meta_file = self.directory / META_FILE
+        if not meta_file.exists():
+            return
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["dtype"] != self.dtype.name:
+                print(f"Embedding cache dtype changed to {self.dtype.name}; starting a new cache")
+                return
+            keys = np.load(self.directory / KEYS_FILE)
+            self.dim, self.count, self.capacity = meta["dim"], int(meta["count"]), int(meta["capacity"])
+            self._last_used = np.zeros(self.capacity, dtype='float64')
+            self._last_used[:self.count] = np.load(self.directory / LAST_USED_FILE)
+            self._keys = [bytes(key) for key in keys[:self.count]]
+            self._rows = {key: row for row, key in enumerate(self._keys)}
+            self._vectors = np.memmap(self.directory / VECTORS_FILE, dtype=self.dtype, mode='r+',
+                                      shape=(self.capacity, self.dim))
+        except Exception as e:
+            print(f"Error loading embedding cache, starting a new one: {e}")
+            self.dim, self.count, self.capacity = None, 0, 0
+            self._keys, self._rows, self._vectors = [], {}, None
+            self._last_used = np.empty(0, dtype='float64')
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, model_name: str, texts: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """Cached float32 vectors (rows for misses are zero) and the positions of the misses"""
+        keys = [cache_key(model_name, text) for text in texts]
+        rows = [self._rows.get(key) for key in keys]
+        misses = [position for position, row in enumerate(rows) if row is None]
+        self.hits += len(texts) - len(misses)
+        self.misses += len(misses)
+        if self.dim is None or len(misses) == len(texts):
+            return None, misses
+        vectors = np.zeros((len(texts), self.dim), dtype='float32')
+        hit_positions = [position for position, row in enumerate(rows) if row is not None]
+        hit_rows = np.array([rows[position] for position in hit_positions], dtype='int64')
+        vectors[hit_positions] = self._vectors[hit_rows]
+        self._last_used[hit_rows] = time.time()
+        return vectors, misses
+
+    def store(self, model_name: str, texts: List[str], vectors: np.ndarray):
+        if not texts:
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            print(f"Not caching {vectors.shape[1]}-d embeddings in a {self.dim}-d cache")
+            return
+        new = {}
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model_name, text)
+            if key not in self._rows:
+                new[key] = vector
+        if not new:
+            return
+        self._reserve(self.count + len(new))
+        start = self.count
+        self._vectors[start:start + len(new)] = np.stack(list(new.values())).astype(self.dtype)
+        for offset, key in enumerate(new):
+            self._rows[key] = start + offset
+            self._keys.append(key)
+        self._last_used[start:start + len(new)] = time.time()
+        self.count += len(new)
+
+    def _reserve(self, rows: int):
+        if rows > self.capacity:
+            self._resize(max(rows, self.capacity * 2, 1024))
+
+    def _resize(self, capacity: int):
+        """Grow or shrink the backing file in place and remap it"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.directory / VECTORS_FILE, 'ab') as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        self._vectors = np.memmap(self.directory / VECTORS_FILE, dtype=self.dtype, mode='r+',
+                                  shape=(capacity, self.dim))
+        last_used = np.zeros(capacity, dtype='float64')
+        last_used[:self.count] = self._last_used[:self.count]
+        self._last_used = last_used
+        self.capacity = capacity
+
+    def flush(self):
+        """Evict down to max_entries if needed and persist the key index"""
+        if self.dim is None:
+            return
+        if self.count > self.max_entries:
+            self.prune(self.max_entries)
+        self._vectors.flush()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        np.save(self.directory / KEYS_FILE, np.array(self._keys, dtype='S20'))
+        np.save(self.directory / LAST_USED_FILE, self._last_used[:self.count])
+        meta = {"dim": self.dim, "dtype": self.dtype.name, "count": self.count, "capacity": self.capacity}
+        with open(self.directory / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def prune(self, max_entries: int) -> int:
+        """Keep only the max_entries most recently used embeddings; returns how many were evicted"""
+        if self.count <= max_entries:
+            return 0
+        keep = np.sort(np.argsort(-self._last_used[:self.count], kind='stable')[:max_entries])
+        evicted = self.count - len(keep)
+        vectors = np.array(self._vectors[keep])
+        last_used = self._last_used[keep]
+        self._keys = [self._keys[row] for row in keep.tolist()]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._vectors[:len(keep)] = vectors
+        self._last_used[:len(keep)] = last_used
+        self.count = len(keep)
+        if self.capacity > 2 * max(self.count, 1024):
+            self._resize(max(self.count, 1024))
+        print(f"Evicted {evicted} least recently used embeddings from the cache")
+        return evicted
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "entries": self.count,
+            "max_entries": self.max_entries,
+            "dimension": self.dim,
+            "dtype": self.dtype.name,
+            "disk_bytes": self.capacity * (self.dim or 0) * self.dtype.itemsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def default_cache_path() -> str:
+    index_path = os.getenv("FAISS_INDEX_PATH", "./database/faiss_index")
+    return os.getenv("EMBEDDING_CACHE_PATH", os.path.join(index_path, "embedding_cache"))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the embedding cache")
+    parser.add_argument("command", choices=("stats", "prune"))
+    parser.add_argument("--path", default=default_cache_path())
+    parser.add_argument("--max-entries", type=int, default=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 2_000_000)))
+    parser.add_argument("--dtype", default=os.getenv("EMBEDDING_CACHE_DTYPE", "float16"))
+    args = parser.parse_args(argv)
+
+    cache = EmbeddingCache(args.path, max_entries=args.max_entries, dtype=args.dtype)
+    if args.command == "prune":
+        cache.prune(args.max_entries)
+        cache.flush()
+    print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
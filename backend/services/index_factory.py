@@ -0,0 +1,231 @@
+import os
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss  # imported inside functions so importing the app does not load FAISS
+
+# Index types understood by build_index; all use inner product over normalized vectors
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# How flat, IVF-flat and HNSW store vectors: 4 bytes per dimension, 2 (float16) or 1 (scalar-quantized)
+VECTOR_ENCODINGS = ("float32", "float16", "sq8")
+
+
+def index_params_from_env() -> Dict[str, Any]:
+    """Build-time parameters for the configured FAISS index type"""
+    index_type = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported FAISS_INDEX_TYPE '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    encoding = os.getenv("VECTOR_ENCODING", "float32").lower()
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unsupported VECTOR_ENCODING '{encoding}', expected one of {', '.join(VECTOR_ENCODINGS)}")
+    return {
+        "type": index_type,
+        # IVF-PQ already compresses its vectors
+        "encoding": "float32" if index_type == "ivf_pq" else encoding,
+        "nlist": int(os.getenv("IVF_NLIST", 0)),  # 0 picks ~4*sqrt(n) at training time
+        "pq_m": int(os.getenv("PQ_M", 16)),
+        "pq_nbits": int(os.getenv("PQ_NBITS", 8)),
+        "hnsw_m": int(os.getenv("HNSW_M", 32)),
+        "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", 200)),
+        "train_sample": int(os.getenv("INDEX_TRAIN_SAMPLE", 100000)),
+    }
+
+
+def search_params_from_env() -> Dict[str, int]:
+    """Query-time knobs; only the ones relevant to the loaded index type take effect"""
+    return {
+        "nprobe": int(os.getenv("FAISS_NPROBE", 16)),
+        "efSearch": int(os.getenv("HNSW_EF_SEARCH", 64)),
+    }
+
+
+def needs_training(params: Dict[str, Any]) -> bool:
+    """Whether the index learns from a sample of vectors (IVF centroids, 8-bit quantizer ranges)"""
+    return params["type"] in ("ivf_flat", "ivf_pq") or params.get("encoding") == "sq8"
+
+
+def _min_training_points(index_type: str, params: Dict[str, Any]) -> int:
+    # FAISS wants ~39 training points per centroid; IVF-PQ also trains 2**nbits centroids per sub-quantizer
+    if index_type == "ivf_pq":
+        return 39 * 2 ** params["pq_nbits"]
+    return 39 if index_type == "ivf_flat" else 0
+
+
+def retrain_reason(params: Dict[str, Any], ntotal: int, growth: float) -> Optional[str]:
+    """Why an index built with ``params`` should be retrained now that it holds ntotal vectors, or None.
+
+    An index that fell back to flat for lack of training data is retrained
+    once there is enough, and a trained index once it has grown ``growth``
+    times past the corpus it was sized for (nlist, training sample).
+    """
+    requested = params.get("requested_type", params["type"])
+    if requested != params["type"] and ntotal >= _min_training_points(requested, params):
+        return f"{ntotal} vectors are now enough to train the requested {requested} index"
+    sized_for = params.get("sized_for", params.get("trained_on", ntotal))
+    if growth > 0 and needs_training(params) and ntotal >= growth * max(1, sized_for):
+        return f"the index has grown from {sized_for} to {ntotal} vectors since it was trained"
+    return None
+
+
+def build_index(params: Dict[str, Any], embeddings: np.ndarray, corpus_size: Optional[int] = None) -> "faiss.Index":
+    """Create an empty ID-mapped index, training it on a sample of embeddings when required.
+
+    nlist is sized for ``corpus_size`` vectors (default: the sample size).
+    Returns the index; ``params`` is updated in place with the values actually
+    used (e.g. the resolved nlist) so they can be persisted with the index.
+    """
+    import faiss
+    n, dimension = embeddings.shape
+    corpus_size = max(n, corpus_size or n)
+    index_type = params.setdefault("requested_type", params["type"])
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = params.get("nlist") or int(4 * np.sqrt(corpus_size))
+        # Shrink nlist to what the training sample supports
+        nlist = max(1, min(nlist, n // 39))
+        if n < _min_training_points(index_type, params):
+            print(f"Only {n} vectors, too few to train {index_type}; using a flat index")
+            index_type = "flat"
+        else:
+            params["nlist"] = nlist
+    params["type"] = index_type
+    if index_type == "ivf_pq":
+        params["encoding"] = "float32"
+    scalar_type = {"float16": faiss.ScalarQuantizer.QT_fp16,
+                   "sq8": faiss.ScalarQuantizer.QT_8bit}.get(params.setdefault("encoding", "float32"))
+
+    if index_type == "flat":
+        if scalar_type is None:
+            inner = faiss.IndexFlatIP(dimension)
+        else:
+            inner = faiss.IndexScalarQuantizer(dimension, scalar_type, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        if scalar_type is None:
+            inner = faiss.IndexHNSWFlat(dimension, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWSQ(dimension, scalar_type, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = params["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat" and scalar_type is not None:
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, dimension, params["nlist"], scalar_type,
+                                                  faiss.METRIC_INNER_PRODUCT)
+        elif index_type == "ivf_flat":
+            inner = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            if dimension % params["pq_m"] != 0:
+                raise ValueError(f"PQ_M={params['pq_m']} must divide the embedding dimension {dimension}")
+            inner = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"],
+                                     params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        sample = _training_sample(embeddings, params["train_sample"])
+        print(f"Training {index_type} index (nlist={params['nlist']}) on {len(sample)} vectors...")
+        inner.train(sample)
+    if not inner.is_trained:
+        # 8-bit scalar quantizers learn each dimension's value range
+        inner.train(_training_sample(embeddings, params["train_sample"]))
+    params["trained_on"] = int(n)
+    params["sized_for"] = int(corpus_size)
+
+    return faiss.IndexIDMap2(inner)
+
+
+def apply_search_params(index: "faiss.Index", search_params: Dict[str, int]):
+    """Set nprobe / efSearch on whichever underlying index understands them"""
+    import faiss
+    parameter_space = faiss.ParameterSpace()
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexIVF):
+        parameter_space.set_index_parameter(index, "nprobe", search_params["nprobe"])
+    elif isinstance(inner, faiss.IndexHNSW):
+        parameter_space.set_index_parameter(index, "efSearch", search_params["efSearch"])
+
+
+def search_parameters(index: "faiss.Index", search_params: Optional[Dict[str, int]],
+                      selector: "faiss.IDSelector") -> "faiss.SearchParameters":
+    """Per-call parameters that restrict a search to the IDs in selector, keeping nprobe / efSearch"""
+    import faiss
+    search_params = search_params or search_params_from_env()
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=search_params["nprobe"])
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=search_params["efSearch"])
+    return faiss.SearchParameters(sel=selector)
+
+
+def remove_ids(index: "faiss.IndexIDMap2", ids: np.ndarray) -> "faiss.IndexIDMap2":
+    """Remove vectors by ID, rebuilding from stored vectors for index types without removal (HNSW).
+
+    Returns the index to use afterwards, which may be a new object.
+    """
+    import faiss
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexIVF):
+        _remove_ivf_ids(index, inner, ids)
+        return index
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        pass
+    current_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(current_ids, ids)
+    vectors = inner.reconstruct_n(0, index.ntotal)[keep]
+    print(f"Rebuilding {type(inner).__name__} without {int((~keep).sum())} removed vectors...")
+    # An empty copy keeps the graph settings and, for HNSW-SQ, the trained quantizer
+    rebuilt_inner = faiss.clone_index(inner)
+    rebuilt_inner.reset()
+    rebuilt = faiss.IndexIDMap2(rebuilt_inner)
+    if len(vectors):
+        rebuilt.add_with_ids(vectors, current_ids[keep])
+    return rebuilt
+
+
+def _remove_ivf_ids(index: "faiss.IndexIDMap2", inner: "faiss.IndexIVF", ids: np.ndarray):
+    """Remove from an ID-mapped IVF index and renumber the internal IDs left in the inverted lists.
+
+    IndexIDMap.remove_ids compacts its ID map assuming the inner index shifts
+    later vectors down, which IVF does not do; without renumbering, every
+    vector added after a removed one would be reported under the wrong ID.
+    """
+    import faiss
+    current_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(current_ids, ids)
+    if keep.all():
+        return
+    inner.remove_ids(faiss.IDSelectorBatch(np.flatnonzero(~keep).astype('int64')))
+    new_positions = np.cumsum(keep) - 1
+    for list_no in range(inner.nlist):
+        size = inner.invlists.list_size(list_no)
+        if size:
+            list_ids = faiss.rev_swig_ptr(inner.invlists.get_ids(list_no), size)
+            list_ids[:] = new_positions[list_ids]
+    faiss.copy_array_to_vector(current_ids[keep], index.id_map)
+    index.ntotal = inner.ntotal
+    index.construct_rev_map()
+
+
+def _training_sample(embeddings: np.ndarray, sample_size: int, seed: int = 1234) -> np.ndarray:
+    if sample_size <= 0 or len(embeddings) <= sample_size:
+        return embeddings
+    rows = np.random.default_rng(seed).choice(len(embeddings), size=sample_size, replace=False)
+    return embeddings[np.sort(rows)]
+
+
+def index_memory_bytes(index: "faiss.Index") -> int:
+    """Serialized size of an index, a close proxy for its resident memory"""
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def describe_index(params: Optional[Dict[str, Any]]) -> str:
+    if not params:
+        return "flat"
+    description = params["type"]
+    if params.get("encoding", "float32") != "float32":
+        description += f"/{params['encoding']}"
+    if params["type"] in ("ivf_flat", "ivf_pq"):
+        description += f" (nlist={params['nlist']})"
+    return description
@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .chunk_store import STORE_FILES
+from .lexical_index import LEXICAL_FILES
+from .near_duplicates import SIGNATURE_IDS_FILE, SIGNATURES_FILE
+from .sharded_index import SHARDS_DIR
+
+MANIFEST_FILE = "manifest.json"
+VERSIONS_DIR = "versions"      # archived index versions, one folder each, inside the index directory
+STAGING_SUFFIX = ".building"   # a version being built by a reload
+LOCK_FILE = "reload.lock"      # held by the process building or swapping a version
+
+# Everything that makes up one index version; the manifest is moved out first and in last
+INDEX_ENTRIES = (SHARDS_DIR, "index.faiss") + STORE_FILES + LEXICAL_FILES + (SIGNATURE_IDS_FILE, SIGNATURES_FILE)
+
+
+class IndexVersions:
+    """The active index in FAISS_INDEX_PATH plus previous versions kept under versions/ for rollback.
+
+    A reload builds into a staging folder beside the active index, then
+    activate() archives the active files and renames the new ones into place.
+    Renames keep the inodes, so memory maps of the previous version stay valid
+    for queries still reading it.
+    """
+
+    def __init__(self, index_path: str, keep: int = 3):
+        self.root = Path(index_path)
+        self.versions_dir = self.root / VERSIONS_DIR
+        self.keep = keep
+
+    @staticmethod
+    def new_version() -> str:
+        """Name for a newly built version: its build time, to the millisecond"""
+        return time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() // 1_000_000 % 1000:03d}"
+
+    @staticmethod
+    def version_of(directory: Path) -> Optional[str]:
+        """Version recorded in a directory's manifest, None if it has no (complete) index"""
+        try:
+            with open(directory / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Indexes built before versioning are named by when their manifest was written
+        return manifest.get("version") or time.strftime(
+            "%Y%m%d-%H%M%S", time.localtime((directory / MANIFEST_FILE).stat().st_mtime))
+
+    def active_version(self) -> Optional[str]:
+        return self.version_of(self.root)
+
+    def archived(self) -> List[Dict[str, Any]]:
+        """Archived versions that can be rolled back to, newest first"""
+        versions = []
+        if self.versions_dir.exists():
+            for directory in self.versions_dir.iterdir():
+                if directory.is_dir() and not directory.name.endswith(STAGING_SUFFIX) and (directory / MANIFEST_FILE).exists():
+                    versions.append({"version": directory.name, "archived_at": directory.stat().st_mtime})
+        return sorted(versions, key=lambda version: version["archived_at"], reverse=True)
+
+    def staging(self) -> Path:
+        """A fresh, empty folder to build the next version in"""
+        directory = self.versions_dir / f"{time.strftime('%Y%m%d-%H%M%S')}{STAGING_SUFFIX}"
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+        return directory
+
+    def activate(self, directory: Path) -> Optional[str]:
+        """Archive the active index under its version and move the index in directory into place.
+
+        The manifest leaves first and arrives last, so a crash part-way leaves
+        no manifest and the next start rebuilds instead of loading a mix.
+        Returns the archived version, or None if there was no active index.
+        """
+        archived = self.active_version()
+        if archived is not None:
+            archive = self.versions_dir / archived
+            suffix = 1
+            while archive.exists():
+                suffix += 1
+                archive = self.versions_dir / f"{archived}-{suffix}"
+            archive.mkdir(parents=True)
+            self._move(self.root, archive, manifest_first=True)
+            os.utime(archive)
+            archived = archive.name
+        self._move(directory, self.root, manifest_first=False)
+        shutil.rmtree(directory, ignore_errors=True)
+        return archived
+
+    @staticmethod
+    def _move(source: Path, target: Path, manifest_first: bool):
+        names = [name for name in INDEX_ENTRIES if (source / name).exists()]
+        names = [MANIFEST_FILE] + names if manifest_first else names + [MANIFEST_FILE]
+        for name in names:
+            os.replace(source / name, target / name)
+
+    def prune(self):
+        """Delete archived versions beyond the newest ``keep`` and staging folders left by interrupted reloads"""
+        if not self.versions_dir.exists():
+            return
+        for directory in self.versions_dir.iterdir():
+            if directory.is_dir() and directory.name.endswith(STAGING_SUFFIX):
+                shutil.rmtree(directory, ignore_errors=True)
+        for version in self.archived()[self.keep:]:
+            # Processes still serving a removed version keep reading their memory-mapped copy
+            shutil.rmtree(self.versions_dir / version["version"], ignore_errors=True)
+
+    @contextmanager
+    def lock(self) -> Iterator[bool]:
+        """Try to become the one process reloading this index; yields False if another one is"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, 'a') as f:
+            try:
+                import fcntl
+            except ImportError:
+                # No advisory locks on Windows; run a single worker there
+                yield True
+                return
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
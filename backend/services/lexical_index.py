@@ -0,0 +1,204 @@
+import json
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+TERMS_FILE = "bm25_terms.json"          # term -> term ID
+TERM_OFFSETS_FILE = "bm25_term_offsets.npy"  # int64[n_terms + 1] slices into the postings arrays
+POSTING_ROWS_FILE = "bm25_posting_rows.npy"  # int32 document rows, grouped by term
+POSTING_TFS_FILE = "bm25_posting_tfs.npy"    # float32 term frequencies matching POSTING_ROWS_FILE
+DOC_IDS_FILE = "bm25_doc_ids.npy"       # int64[n_docs] FAISS ID of each document row
+DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"    # float32[n_docs] tokens per document
+
+LEXICAL_FILES = (TERMS_FILE, TERM_OFFSETS_FILE, POSTING_ROWS_FILE, POSTING_TFS_FILE, DOC_IDS_FILE, DOC_LENGTHS_FILE)
+
+# Very common words that would otherwise dominate short questions
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+    "if", "in", "is", "it", "my", "of", "on", "or", "the", "this", "to", "what", "when", "which",
+    "who", "will", "with", "under", "me", "there", "any", "am", "was", "were", "should", "would",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and numbers; dotted clause numbers such as 4.1.2 stay one token"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, stored as flat numpy postings arrays.
+
+    Scoring a query touches only the postings of its terms and accumulates them
+    with vectorized numpy operations.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms: Dict[str, int] = {}
+        self.term_offsets = np.zeros(1, dtype='int64')
+        self.posting_rows = np.empty(0, dtype='int32')
+        self.posting_tfs = np.empty(0, dtype='float32')
+        self.doc_ids = np.empty(0, dtype='int64')
+        self.doc_lengths = np.empty(0, dtype='float32')
+        self._prepare()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def _prepare(self):
+        n_docs = len(self.doc_ids)
+        self.avg_length = float(self.doc_lengths.mean()) if n_docs else 0.0
+        self.length_norm = (self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_length, 1e-6))).astype('float32')
+        document_frequency = np.diff(self.term_offsets).astype('float32')
+        self.idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype('float32')
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str]], k1: float = 1.5, b: float = 0.75) -> "LexicalIndex":
+        """Build from (FAISS ID, text) pairs"""
+        return cls(k1, b).update(set(), documents)
+
+    def update(self, removed_ids: Set[int], documents: Iterable[Tuple[int, str]]) -> "LexicalIndex":
+        """A new index without the documents of removed_ids and with (FAISS ID, text) pairs appended.
+
+        Surviving postings are carried over as arrays, so only the appended texts
+        are tokenized; this index is left untouched and can keep serving.
+        """
+        index = LexicalIndex(self.k1, self.b)
+        index.terms = dict(self.terms)
+
+        # Postings of the appended documents, one (term, row, tf) entry per distinct term of a document
+        keep = ~np.isin(self.doc_ids, np.fromiter(removed_ids, dtype='int64', count=len(removed_ids)))
+        first_row = int(np.count_nonzero(keep))
+        new_terms, new_rows, new_tfs = array('i'), array('i'), array('f')
+        new_ids, new_lengths = array('q'), array('f')
+        for row, (chunk_id, text) in enumerate(documents, start=first_row):
+            tokens = tokenize(text)
+            counts = Counter(index.terms.setdefault(token, len(index.terms)) for token in tokens)
+            new_terms.extend(counts.keys())
+            new_rows.extend([row] * len(counts))
+            new_tfs.extend(counts.values())
+            new_ids.append(chunk_id)
+            new_lengths.append(len(tokens))
+
+        # Surviving postings keep their order; rows are renumbered past the removed documents
+        old_terms = np.repeat(np.arange(len(self.term_offsets) - 1, dtype='int32'), np.diff(self.term_offsets))
+        kept = keep[self.posting_rows]
+        renumbered = (np.cumsum(keep) - 1).astype('int32')
+        terms = np.concatenate([old_terms[kept], np.frombuffer(new_terms, dtype='int32')])
+        rows = np.concatenate([renumbered[self.posting_rows[kept]], np.frombuffer(new_rows, dtype='int32')])
+        tfs = np.concatenate([self.posting_tfs[kept], np.frombuffer(new_tfs, dtype='float32')])
+        del old_terms, kept, new_terms, new_rows, new_tfs
+
+        # Terms no document contains any more are dropped from the vocabulary
+        frequency = np.bincount(terms, minlength=len(index.terms))
+        if np.any(frequency == 0):
+            live = frequency > 0
+            term_map = (np.cumsum(live) - 1).astype('int32')
+            index.terms = {token: int(term_map[term_id]) for token, term_id in index.terms.items() if live[term_id]}
+            terms = term_map[terms]
+            frequency = frequency[live]
+
+        # Group by term; the stable sort keeps rows ascending within each term
+        order = np.argsort(terms, kind='stable')
+        del terms
+        index.posting_rows = rows[order]
+        del rows
+        index.posting_tfs = tfs[order]
+        del tfs, order
+        index.term_offsets = np.concatenate([[0], np.cumsum(frequency)]).astype('int64')
+        index.doc_ids = np.concatenate([self.doc_ids[keep], np.frombuffer(new_ids, dtype='int64')])
+        index.doc_lengths = np.concatenate([self.doc_lengths[keep], np.frombuffer(new_lengths, dtype='float32')])
+        index._prepare()
+        return index
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+        """Top-k (BM25 scores, FAISS IDs) plus the idf-weighted share of query terms the best hit contains.
+
+        mask, if given, is a boolean array over documents in index order; only
+        documents where it is True can be returned.
+        """
+        query_terms = set(tokenize(query))
+        term_ids = sorted(self.terms[token] for token in query_terms if token in self.terms)
+        if not term_ids or not len(self.doc_ids):
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64'), 0.0
+
+        scores = np.zeros(len(self.doc_ids), dtype='float32')
+        for term_id in term_ids:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            rows = self.posting_rows[start:end]
+            tfs = self.posting_tfs[start:end]
+            # Rows are unique within one term's postings, so fancy-index accumulation is safe
+            scores[rows] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self.length_norm[rows])
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64'), 0.0
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])][:k]
+
+        # Coverage of the query by the best lexical hit, used as a routing confidence
+        best_row = top[0]
+        matched = 0.0
+        for term_id in term_ids:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            if best_row in self.posting_rows[start:end]:
+                matched += self.idf[term_id]
+        # Unknown query terms count against coverage with the highest idf in the corpus
+        unknown = len(query_terms) - len(term_ids)
+        total = float(self.idf[term_ids].sum()) + unknown * float(self.idf.max())
+        coverage = matched / total if total else 0.0
+        return scores[top], self.doc_ids[top], float(coverage)
+
+    def save(self, directory: str):
+        """Write each file beside its target and move it into place, so a loaded copy mapping the old files stays valid"""
+        directory = Path(directory)
+        arrays = {
+            TERM_OFFSETS_FILE: self.term_offsets,
+            POSTING_ROWS_FILE: self.posting_rows,
+            POSTING_TFS_FILE: self.posting_tfs,
+            DOC_IDS_FILE: self.doc_ids,
+            DOC_LENGTHS_FILE: self.doc_lengths,
+        }
+        for name, values in arrays.items():
+            with open(directory / f"{name}.tmp", 'wb') as f:
+                np.save(f, values)
+        with open(directory / f"{TERMS_FILE}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.terms, f)
+        for name in LEXICAL_FILES:
+            os.replace(directory / f"{name}.tmp", directory / name)
+
+    @classmethod
+    def load(cls, directory: str, k1: float = 1.5, b: float = 0.75) -> Optional["LexicalIndex"]:
+        directory = Path(directory)
+        if not all((directory / name).exists() for name in LEXICAL_FILES):
+            return None
+        index = cls(k1, b)
+        with open(directory / TERMS_FILE, 'r', encoding='utf-8') as f:
+            index.terms = json.load(f)
+        index.term_offsets = np.load(directory / TERM_OFFSETS_FILE, mmap_mode='r')
+        index.posting_rows = np.load(directory / POSTING_ROWS_FILE, mmap_mode='r')
+        index.posting_tfs = np.load(directory / POSTING_TFS_FILE, mmap_mode='r')
+        index.doc_ids = np.load(directory / DOC_IDS_FILE, mmap_mode='r')
+        index.doc_lengths = np.load(directory / DOC_LENGTHS_FILE)
+        index._prepare()
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> List[int]:
+    """Fuse ranked ID lists; IDs ranked well by either retriever float to the top"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking.tolist()):
+            if chunk_id >= 0:
+                fused[chunk_id] += 1.0 / (rrf_k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
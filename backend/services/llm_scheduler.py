@@ -0,0 +1,138 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .metrics import llm_scheduler_events, observe_stage
+
+
+class LLMSchedulerError(Exception):
+    pass
+
+
+class LLMOverloaded(LLMSchedulerError):
+    """The wait queue for model calls is full; callers should answer 503 and retry later"""
+
+
+class LLMDeadlineExceeded(LLMSchedulerError):
+    """The request's deadline passed before the model answered"""
+
+
+class _Flight:
+    """One model call shared by every request that asked for the same prompt while it ran"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.queued = True
+
+
+class LLMScheduler:
+    """Runs blocking model calls on a dedicated thread pool with bounded concurrency and queueing.
+
+    At most max_concurrency calls run at once and at most max_queue wait for a
+    slot; beyond that calls are rejected immediately with LLMOverloaded. Calls
+    with the same key that overlap share one generation (single flight). Each
+    caller waits only until its own deadline; a call nobody waits for any more
+    is cancelled if it has not started yet.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 64, timeout_seconds: float = 60.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.queued = 0
+        self.in_flight = 0
+
+    def deadline(self) -> float:
+        """Default absolute deadline (time.monotonic()) for a call starting now"""
+        return time.monotonic() + self.timeout
+
+    def saturated(self) -> bool:
+        return self.in_flight + self.queued >= self.max_concurrency + self.max_queue
+
+    async def run(self, fn: Callable[[], Any], key: Optional[Hashable] = None, deadline: Optional[float] = None) -> Any:
+        """Run fn on the model pool, joining an identical in-flight call when key matches one"""
+        deadline = deadline if deadline is not None else self.deadline()
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None:
+            llm_scheduler_events.inc("coalesced")
+        else:
+            if self.saturated():
+                llm_scheduler_events.inc("rejected")
+                raise LLMOverloaded("LLM service is at capacity, please retry shortly")
+            # Counted as queued right away so a burst within one loop tick cannot overshoot max_queue
+            self.queued += 1
+            flight = _Flight()
+            flight.task = asyncio.get_running_loop().create_task(self._execute(fn, flight))
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            if key is not None:
+                self._flights[key] = flight
+        return await self._wait(flight, deadline)
+
+    def _finish(self, key: Optional[Hashable], flight: _Flight):
+        if not flight.task.cancelled():
+            flight.task.exception()  # retrieved here in case every waiter already gave up
+        if flight.queued:
+            # Cancelled before it got a slot
+            flight.queued = False
+            self.queued -= 1
+        if key is not None and self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _wait(self, flight: _Flight, deadline: float) -> Any:
+        flight.waiters += 1
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            # Shield so one caller timing out does not cancel the call for the others
+            return await asyncio.wait_for(asyncio.shield(flight.task), remaining)
+        except asyncio.TimeoutError:
+            llm_scheduler_events.inc("deadline_exceeded")
+            raise LLMDeadlineExceeded("LLM call did not finish before the request deadline")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody wants the answer: drop it from the queue (a running thread finishes on its own)
+                flight.task.cancel()
+                llm_scheduler_events.inc("cancelled")
+
+    async def _execute(self, fn: Callable[[], Any], flight: _Flight) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        submitted = time.perf_counter()
+        await self._slots.acquire()
+        flight.queued = False
+        self.queued -= 1
+        self.in_flight += 1
+        observe_stage("llm_queue", time.perf_counter() - submitted)
+
+        def release(_):
+            # The slot is held until the thread is really done, even if the caller was cancelled
+            loop.call_soon_threadsafe(self._release)
+
+        started = time.perf_counter()
+        future = self._executor.submit(fn)
+        future.add_done_callback(release)
+        result = await asyncio.wrap_future(future)
+        observe_stage("llm", time.perf_counter() - started)
+        return result
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "coalescing": len(self._flights),
+        }
@@ -1,23 +1,49 @@
 import os
+import re
+import time
 import asyncio
-from typing import List, Optional
+import threading
+from typing import AsyncIterator, List, Optional
+
+from .llm_scheduler import LLMScheduler, LLMSchedulerError
+from .metrics import observe_stage, prompt_chars, timed_stage
 
 try:
     import google.generativeai as genai  # type: ignore
 except Exception:
     genai = None
 
+# Returned to the user instead of raising when generation fails
+ERROR_MESSAGE = "Sorry, there was an error processing your insurance query. Please try again."
+
 
 class LocalDummyLLM:
     """A tiny local fallback LLM for development/testing that echoes the prompt."""
-    def __init__(self):
-        pass
+    def __init__(self, latency_ms: Optional[float] = None):
+        # Artificial generation time, so benchmarks and load tests behave like a remote model
+        if latency_ms is None:
+            latency_ms = float(os.getenv("LOCAL_LLM_LATENCY_MS", 0))
+        self.latency = latency_ms / 1000
 
-    async def generate_content(self, prompt: str):
+    def generate_content(self, prompt: str, stream: bool = False):
+        # Synchronous like the Gemini SDK; with stream=True yields word-sized chunks
         class Resp:
             def __init__(self, text: str):
                 self.text = text
-        return Resp(prompt[:200] + ("..." if len(prompt) > 200 else ""))
+        text = prompt[:200] + ("..." if len(prompt) > 200 else "")
+        if stream:
+            return self._stream(text, Resp)
+        if self.latency:
+            time.sleep(self.latency)
+        return Resp(text)
+
+    def _stream(self, text: str, resp_type):
+        words = re.findall(r"\S+\s*", text)
+        for word in words:
+            if self.latency:
+                # Spread the latency over the chunks like a model emitting tokens
+                time.sleep(self.latency / len(words))
+            yield resp_type(word)
 
 
 class FinanceRAGService:
@@ -32,6 +58,12 @@ class FinanceRAGService:
         else:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Dedicated pool for model calls: bounded concurrency and queue, deadlines, identical prompts coalesced
+        self.scheduler = LLMScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 64)),
+            timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+        )
         
         # RAG prompt template for insurance policies
         self.rag_prompt_template = """Answer as FinTell, an expert Insurance Policy Explainer, using this context:
@@ -64,41 +96,122 @@ IMPORTANT DISCLAIMER: This response is for informational purposes and may not re
 
 Answer:"""
     
-    async def generate_rag_response(self, query: str, context: str, sources: List[str]) -> str:
+    async def generate_rag_response(self, query: str, context: str, sources: List[str],
+                                    deadline: Optional[float] = None) -> str:
         """Generate insurance-focused RAG response with retrieved context"""
         try:
-            prompt = self.rag_prompt_template.format(
-                context=context,
-                query=query
-            )
-            response = await self._generate_response(prompt)
+            with timed_stage("prompt"):
+                prompt = self.rag_prompt_template.format(
+                    context=context,
+                    query=query
+                )
+            prompt_chars.observe(len(prompt), "rag")
+            response = await self._generate_response(prompt, deadline)
             if sources:
                 sources_text = "\n\n**Sources:**\n" + "\n".join(f"- {source}" for source in sources)
                 response += sources_text
             return response
+        except LLMSchedulerError:
+            raise
         except Exception as e:
             print(f"Error generating RAG response: {e}")
-            return "Sorry, there was an error processing your insurance query. Please try again."
+            return ERROR_MESSAGE
     
-    async def generate_fallback_response(self, query: str) -> str:
+    async def generate_fallback_response(self, query: str, deadline: Optional[float] = None) -> str:
         """Generate insurance-focused response when no context is available"""
         try:
-            prompt = self.fallback_prompt_template.format(query=query)
-            response = await self._generate_response(prompt)
+            with timed_stage("prompt"):
+                prompt = self.fallback_prompt_template.format(query=query)
+            prompt_chars.observe(len(prompt), "fallback")
+            response = await self._generate_response(prompt, deadline)
             return response
+        except LLMSchedulerError:
+            raise
         except Exception as e:
             print(f"Error generating fallback response: {e}")
-            return "Sorry, there was an error processing your insurance query. Please try again."
+            return ERROR_MESSAGE
+    
+    async def stream_rag_response(self, query: str, context: str, sources: List[str],
+                                  deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream an insurance-focused RAG response as text chunks, followed by the sources"""
+        prompt = self.rag_prompt_template.format(
+            context=context,
+            query=query
+        )
+        prompt_chars.observe(len(prompt), "rag")
+        async for text in self._stream_response(prompt, deadline):
+            yield text
+        if sources:
+            yield "\n\n**Sources:**\n" + "\n".join(f"- {source}" for source in sources)
+    
+    async def stream_fallback_response(self, query: str, deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream an insurance-focused response when no context is available"""
+        prompt = self.fallback_prompt_template.format(query=query)
+        prompt_chars.observe(len(prompt), "fallback")
+        async for text in self._stream_response(prompt, deadline):
+            yield text
+    
+    async def _stream_response(self, prompt: str, deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Relay streamed model chunks from a worker thread as they are produced"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        stop = threading.Event()
+        
+        def produce():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if stop.is_set():
+                        break  # client went away; stop pulling from the model
+                    if chunk.text:
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+            except Exception as e:
+                print(f"Error streaming from Gemini API: {e}")
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+        
+        def producer_done(task: asyncio.Task):
+            # Rejected, past the deadline or failed before produce() could report it itself
+            if not task.cancelled() and task.exception() is not None:
+                queue.put_nowait(task.exception())
+        
+        started = time.perf_counter()
+        first_token = True
+        completed = False
+        # Streams hold a scheduler slot for their whole length and are never coalesced
+        producer = asyncio.ensure_future(self.scheduler.run(produce, deadline=deadline))
+        producer.add_done_callback(producer_done)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    completed = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if first_token:
+                    observe_stage("llm_first_token", time.perf_counter() - started)
+                    first_token = False
+                yield item
+        finally:
+            stop.set()
+            if not completed and not producer.done():
+                producer.cancel()
+            observe_stage("llm_stream", time.perf_counter() - started)
     
-    async def _generate_response(self, prompt: str) -> str:
+    async def _generate_response(self, prompt: str, deadline: Optional[float] = None) -> str:
         """Generate response using Google Generative AI"""
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: self.model.generate_content(prompt)
+            # Identical prompts in flight at the same time share one model call
+            response = await self.scheduler.run(
+                lambda: self.model.generate_content(prompt),
+                key=prompt,
+                deadline=deadline
             )
             return response.text.strip()
+        except LLMSchedulerError:
+            raise
         except Exception as e:
             print(f"Error calling Gemini API: {e}")
             raise e
@@ -0,0 +1,209 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Stage latencies from sub-millisecond FAISS searches up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192)
+CHAR_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+# Stage durations of the current request, for the Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+class _Sharded:
+    """Per-thread value shards: writers touch only their own thread's dict, readers sum all shards.
+
+    The event loop and each executor thread record without taking a lock;
+    the lock is only held when a thread creates its shard and at scrape time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self, width: int) -> Dict[Tuple[str, ...], List[float]]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = merged.setdefault(labels, [0.0] * width)
+                for position, value in enumerate(values):
+                    total[position] += value
+        return merged
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0.0]
+        values[0] += amount
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, (value,) in sorted(self._merged(1).items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # One slot per bucket plus +Inf, then sum and count
+            values = shard[labels] = [0.0] * (len(self.buckets) + 3)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, values in sorted(self._merged(len(self.buckets) + 3).items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(values[-1])}"
+
+
+class Gauge:
+    """Value read from a callback at scrape time, e.g. a queue length"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(float(self.read()))}"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[object] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.register(Histogram(
+    "fintell_stage_seconds", "Time spent in each stage of answering a question", ("stage",)))
+route_total = registry.register(Counter(
+    "fintell_route_total", "Questions by answer route (rag, fallback, cache_exact, cache_semantic)", ("route",)))
+retrieval_score = registry.register(Histogram(
+    "fintell_retrieval_score", "Best retrieval score per question", buckets=SCORE_BUCKETS))
+llm_scheduler_events = registry.register(Counter(
+    "fintell_llm_scheduler_events_total", "LLM calls coalesced, rejected as overloaded, past their deadline or cancelled", ("event",)))
+http_request_seconds = registry.register(Histogram(
+    "fintell_http_request_seconds", "HTTP request latency until the response starts", ("path", "status")))
+context_tokens = registry.register(Histogram(
+    "fintell_context_tokens", "Tokens of retrieved context packed into each answer", buckets=TOKEN_BUCKETS))
+context_chunks = registry.register(Counter(
+    "fintell_context_chunks_total", "Retrieved chunks included in the context or dropped (redundant, over_budget)", ("outcome",)))
+prompt_chars = registry.register(Histogram(
+    "fintell_prompt_chars", "Characters in each prompt sent to the LLM", ("kind",), buckets=CHAR_BUCKETS))
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration in the histogram and in the current request's Server-Timing"""
+    stage_seconds.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def add_request_timings(timings: Dict[str, float]):
+    """Attach stage durations measured elsewhere (e.g. in a batch worker thread) to the current request"""
+    current = _request_timings.get()
+    if current is not None:
+        for stage, seconds in timings.items():
+            current[stage] = current.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def start_request_timings() -> Tuple[Dict[str, float], contextvars.Token]:
+    timings: Dict[str, float] = {}
+    return timings, _request_timings.set(timings)
+
+
+def finish_request_timings(token: contextvars.Token):
+    _request_timings.reset(token)
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
@@ -0,0 +1,138 @@
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SIGNATURES_FILE = "minhash_signatures.npy"  # uint32[n, num_perm], row-aligned with SIGNATURE_IDS_FILE
+SIGNATURE_IDS_FILE = "minhash_ids.npy"      # int64[n] FAISS ID of each canonical chunk
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+class NearDuplicateIndex:
+    """MinHash signatures with LSH banding to find chunks that are near-copies of already indexed ones.
+
+    Boilerplate repeated across policies (definitions, grievance clauses) is
+    detected by estimated Jaccard similarity of word shingles, so only one
+    vector is kept for it. Candidate lookup is vectorized per band with
+    sorted band hashes and searchsorted.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.95, shingle_size: int = 3, seed: int = 7):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Coefficients below 2**32 keep a*x + b within uint64 for 32-bit shingle hashes
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype='uint64')
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype='uint64')
+        self._band_weights = rng.integers(1, 1 << 62, self.rows_per_band, dtype='uint64') | np.uint64(1)
+
+        self.ids = np.empty(0, dtype='int64')
+        self.signatures = np.empty((0, num_perm), dtype='uint32')
+        self._sorted_bands: List[Tuple[np.ndarray, np.ndarray]] = []
+        # Signatures added since the last reindex, checked with a plain dict
+        self._pending: Dict[Tuple[int, int], int] = {}
+        self._pending_ids: List[int] = []
+        self._pending_signatures: List[np.ndarray] = []
+
+    def signature(self, text: str, namespace: str = "") -> np.ndarray:
+        """MinHash signature of the text's word shingles.
+
+        Texts in different namespaces never match, and neither do texts whose
+        numbers differ: "36 months" and "48 months" in otherwise identical
+        clauses are different terms, not boilerplate.
+        """
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < self.shingle_size:
+            shingles = [" ".join(words)]
+        else:
+            shingles = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        # Amounts, periods and percentages in order, with digit grouping ("1,00,000") removed
+        numbers = " ".join(number.replace(",", "") for number in _NUMBER.findall(text))
+        prefix = f"{namespace}\x00{numbers}\x00"
+        hashes = np.array([zlib.crc32((prefix + shingle).encode('utf-8')) for shingle in set(shingles)], dtype='uint64')
+        # Universal hashing (a*x + b) mod p for all permutations at once, then min over shingles
+        permuted = ((hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_MERSENNE_PRIME)) & np.uint64(_MAX_HASH)
+        return permuted.min(axis=0).astype('uint32')
+
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        bands = signatures.reshape(len(signatures), self.bands, self.rows_per_band).astype('uint64')
+        return (bands * self._band_weights).sum(axis=2)  # wraps modulo 2**64, which is fine for bucketing
+
+    def load(self, ids: np.ndarray, signatures: np.ndarray):
+        self.ids = np.asarray(ids, dtype='int64')
+        self.signatures = np.asarray(signatures, dtype='uint32').reshape(-1, self.num_perm)
+        self._reindex()
+
+    def _reindex(self):
+        band_hashes = self._band_hashes(self.signatures)
+        self._sorted_bands = []
+        for band in range(self.bands):
+            order = np.argsort(band_hashes[:, band], kind='stable')
+            self._sorted_bands.append((band_hashes[order, band], order))
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """FAISS ID of an indexed chunk whose estimated Jaccard similarity passes the threshold"""
+        band_hashes = self._band_hashes(signature[None, :])[0]
+        candidates = set()
+        for band, (sorted_hashes, order) in enumerate(self._sorted_bands):
+            start, end = np.searchsorted(sorted_hashes, band_hashes[band], side='left'), np.searchsorted(sorted_hashes, band_hashes[band], side='right')
+            candidates.update(order[start:end].tolist())
+        best_id, best_similarity = None, self.threshold
+        for row in candidates:
+            similarity = float(np.mean(self.signatures[row] == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = int(self.ids[row]), similarity
+        if best_id is not None:
+            return best_id
+        for band in range(self.bands):
+            row = self._pending.get((band, int(band_hashes[band])))
+            if row is not None and float(np.mean(self._pending_signatures[row] == signature)) >= self.threshold:
+                return self._pending_ids[row]
+        return None
+
+    def add(self, chunk_id: int, signature: np.ndarray):
+        row = len(self._pending_ids)
+        self._pending_ids.append(chunk_id)
+        self._pending_signatures.append(signature)
+        for band, band_hash in enumerate(self._band_hashes(signature[None, :])[0].tolist()):
+            self._pending.setdefault((band, band_hash), row)
+
+    def remove(self, chunk_ids: set):
+        """Drop indexed signatures of chunks that no longer exist"""
+        if not chunk_ids:
+            return
+        self._commit_pending()
+        keep = ~np.isin(self.ids, np.fromiter(chunk_ids, dtype='int64', count=len(chunk_ids)))
+        self.ids = self.ids[keep]
+        self.signatures = self.signatures[keep]
+        self._reindex()
+
+    def _commit_pending(self):
+        if not self._pending_ids:
+            return
+        self.ids = np.concatenate([self.ids, np.array(self._pending_ids, dtype='int64')])
+        self.signatures = np.concatenate([self.signatures, np.stack(self._pending_signatures)])
+        self._pending, self._pending_ids, self._pending_signatures = {}, [], []
+        self._reindex()
+
+    def save(self, directory: str):
+        self._commit_pending()
+        np.save(Path(directory) / SIGNATURE_IDS_FILE, self.ids)
+        np.save(Path(directory) / SIGNATURES_FILE, self.signatures)
+
+    @staticmethod
+    def saved(directory: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        directory = Path(directory)
+        if not (directory / SIGNATURES_FILE).exists() or not (directory / SIGNATURE_IDS_FILE).exists():
+            return None
+        return np.load(directory / SIGNATURE_IDS_FILE), np.load(directory / SIGNATURES_FILE)
@@ -0,0 +1,92 @@
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict
+
+# EMBEDDING_BACKEND values; "onnx" runs the same model through ONNX Runtime
+EMBEDDING_BACKENDS = ("torch", "onnx")
+# ONNX_QUANTIZE values: dynamic int8 quantization tuned for a CPU instruction set, or none
+QUANTIZATION_CONFIGS = ("none", "arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def default_onnx_path() -> str:
+    index_path = os.getenv("FAISS_INDEX_PATH", "./database/faiss_index")
+    return os.getenv("ONNX_MODEL_PATH", os.path.join(index_path, "onnx_models"))
+
+
+def encoder_settings_from_env() -> Dict[str, Any]:
+    """Embedding backend, int8 quantization and ONNX Runtime thread counts"""
+    backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported EMBEDDING_BACKEND '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    quantize = os.getenv("ONNX_QUANTIZE", "none").lower()
+    if quantize not in QUANTIZATION_CONFIGS:
+        raise ValueError(f"Unsupported ONNX_QUANTIZE '{quantize}', expected one of {', '.join(QUANTIZATION_CONFIGS)}")
+    return {
+        "backend": backend,
+        "quantize": quantize,
+        # 0 lets ONNX Runtime use one thread per physical core
+        "intra_op_threads": int(os.getenv("ONNX_INTRA_OP_THREADS", 0)),
+        "inter_op_threads": int(os.getenv("ONNX_INTER_OP_THREADS", 1)),
+        "path": default_onnx_path(),
+    }
+
+
+def encoder_id(model_name: str, settings: Dict[str, Any]) -> str:
+    """Name stored vectors are cached and indexed under.
+
+    Full-precision ONNX reproduces the PyTorch vectors to float rounding, so
+    it shares their name; int8 vectors differ enough to need their own index.
+    """
+    if settings["backend"] == "onnx" and settings["quantize"] != "none":
+        return f"{model_name}#onnx-qint8-{settings['quantize']}"
+    return model_name
+
+
+def load_onnx_model(model_name: str, settings: Dict[str, Any]):
+    """A SentenceTransformer running on ONNX Runtime, exported (and quantized) on first use.
+
+    The export is kept under ONNX_MODEL_PATH, so later starts load it directly.
+    Needs ``pip install "sentence-transformers[onnx]"``.
+    """
+    from sentence_transformers import SentenceTransformer
+    export_dir = Path(settings["path"]) / re.sub(r"[^\w.-]+", "__", model_name)
+    if _onnx_file(export_dir) is None:
+        print(f"Exporting {model_name} to ONNX in {export_dir}...")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(str(export_dir))
+    file_name = _onnx_file(export_dir)
+    if file_name is None:
+        raise RuntimeError(f"ONNX export of {model_name} produced no model file in {export_dir}")
+    if settings["quantize"] != "none":
+        quantized = f"onnx/model_qint8_{settings['quantize']}.onnx"
+        if not (export_dir / quantized).exists():
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            print(f"Quantizing {model_name} to int8 ({settings['quantize']})...")
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(str(export_dir), backend="onnx", model_kwargs={"file_name": file_name}),
+                settings["quantize"], str(export_dir))
+        file_name = quantized
+    return SentenceTransformer(str(export_dir), backend="onnx", model_kwargs={
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": _session_options(settings),
+    })
+
+
+def _onnx_file(export_dir: Path):
+    # sentence-transformers saves exports under onnx/; older optimum versions at the top level
+    for name in ("onnx/model.onnx", "model.onnx"):
+        if (export_dir / name).exists():
+            return name
+    return None
+
+
+def _session_options(settings: Dict[str, Any]):
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = settings["intra_op_threads"]
+    options.inter_op_num_threads = settings["inter_op_threads"]
+    # One model call at a time per request; parallelism comes from intra-op threads and concurrent requests
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
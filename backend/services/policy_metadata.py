@@ -0,0 +1,132 @@
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Chunk metadata fields usable as shard keys and /ask filters
+FACETS = ("insurer", "product", "doc_type")
+# Recorded in the index manifest; bump when extraction changes so indexes are rebuilt with the new values
+METADATA_VERSION = 2
+
+# Product lines by keywords in the policy text or a JSON category field, most specific first
+PRODUCT_KEYWORDS = (
+    ("personal_accident", ("personal accident", "accidental death")),
+    ("critical_illness", ("critical illness",)),
+    ("travel", ("travel insurance", "overseas travel", "trip cancellation", "baggage")),
+    ("motor", ("motor", "vehicle", "two wheeler", "own damage", "third party liability")),
+    ("home", ("home insurance", "householder", "home contents", "burglary")),
+    ("life", ("life insurance", "term plan", "term insurance", "death benefit", "maturity benefit", "endowment")),
+    ("health", ("health", "hospitalisation", "hospitalization", "mediclaim", "cashless")),
+)
+DOC_TYPE_KEYWORDS = (
+    ("claim_form", ("claim form",)),
+    ("proposal_form", ("proposal form",)),
+    ("brochure", ("brochure", "key features")),
+    ("prospectus", ("prospectus",)),
+    ("endorsement", ("endorsement",)),
+    ("faq", ("faq", "frequently asked questions")),
+    ("policy_wording", ("policy wording", "terms and conditions", "policy schedule", "policy document")),
+)
+# "Star Health and Allied Insurance Co. Ltd.", "HDFC ERGO General Insurance Company Limited", "The New India Assurance"
+# Within one line, and without digits, so UIN codes and headings on the lines above are not taken in
+INSURER_PATTERN = re.compile(
+    r"((?:(?:[A-Z][A-Za-z&'.-]*|and|&)[ \t]+){1,6}?(?:Insurance|Assurance)"
+    r"(?:[ \t]+(?:Company|Corporation|Co\b\.?))?(?:[ \t]+(?:Limited|Ltd\b\.?))?)"
+)
+# Words that end a heading rather than belong to a name: "POLICY WORDINGS Tata AIG General Insurance"
+INSURER_BOUNDARY_WORDS = {"policy", "policies", "wording", "wordings", "prospectus", "brochure", "schedule",
+                          "certificate", "form", "terms", "conditions", "endorsement", "uin", "by", "from", "with"}
+CORPORATE_SUFFIXES = {"the", "company", "co", "corporation", "limited", "ltd"}
+
+# JSON dataset fields that carry metadata directly
+INSURER_FIELDS = ("insurer", "insurer_name", "insurance_company", "company", "company_name", "provider")
+PRODUCT_FIELDS = ("product", "product_line", "line_of_business", "category", "insurance_type", "policy_type", "plan_type")
+DOC_TYPE_FIELDS = ("doc_type", "document_type")
+PRODUCT_NAME_FIELDS = ("product_name", "policy_name", "plan_name")
+
+# Only the start of a document is scanned for the insurer and document type
+HEADER_CHARS = 3000
+
+
+def normalize_facet(value: Optional[str]) -> str:
+    """Lowercase words without punctuation or corporate suffixes, so "HDFC ERGO ... Ltd." matches "hdfc ergo" """
+    words = re.findall(r"[a-z0-9]+", (value or "").lower())
+    while words and words[-1] in CORPORATE_SUFFIXES:
+        words.pop()
+    while words and words[0] in CORPORATE_SUFFIXES:
+        words.pop(0)
+    return " ".join(words)
+
+
+def facet_matches(wanted: str, value: str) -> bool:
+    """True if every word of the filter value appears in the stored value, both normalized"""
+    wanted_words = normalize_facet(wanted).split()
+    return bool(wanted_words) and set(wanted_words) <= set(normalize_facet(value).split())
+
+
+def _classify(text: str, keywords) -> Optional[str]:
+    # PDF text often has doubled spaces or line breaks inside phrases ("POLICY  WORDINGS")
+    text = " ".join(text.lower().split())
+    counts = {label: sum(text.count(word) for word in words) for label, words in keywords}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else None
+
+
+def _insurer_in_text(header: str) -> Optional[str]:
+    """First insurer name in the text, starting after any heading words captured before it"""
+    for match in INSURER_PATTERN.finditer(header):
+        words = match.group(1).split()
+        cut = max((position + 1 for position, word in enumerate(words)
+                   if word.lower().strip(".") in INSURER_BOUNDARY_WORDS), default=0)
+        name = " ".join(words[cut:])
+        if normalize_facet(name) not in ("", "insurance", "assurance"):
+            return name
+    return None
+
+
+def extract_metadata(file_path: Path, content: str, database_path: Optional[str] = None,
+                     item: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[str]]:
+    """Insurer, product line and document type of one document, normalized for matching.
+
+    Explicit JSON fields win, then the first folder under DATABASE_PATH (taken
+    as the insurer), then patterns in the file name and the start of the text.
+    Fields that cannot be determined are None.
+    """
+    item = item if isinstance(item, dict) else {}
+
+    def field(names) -> Optional[str]:
+        for name in names:
+            value = item.get(name)
+            if isinstance(value, str) and value.strip():
+                return value
+        return None
+
+    header = content[:HEADER_CHARS]
+    insurer = field(INSURER_FIELDS)
+    if insurer is None and database_path is not None:
+        try:
+            folders = file_path.resolve().relative_to(Path(database_path).resolve()).parts[:-1]
+        except ValueError:
+            folders = ()
+        if folders:
+            insurer = folders[0].replace("_", " ")
+    if insurer is None:
+        insurer = _insurer_in_text(header)
+
+    product_hint = field(PRODUCT_FIELDS)
+    product = _classify(product_hint, PRODUCT_KEYWORDS) if product_hint else None
+    if product is None:
+        product = normalize_facet(product_hint) if product_hint else _classify(
+            " ".join(filter(None, [field(PRODUCT_NAME_FIELDS), file_path.stem.replace("_", " "), content])),
+            PRODUCT_KEYWORDS)
+
+    doc_type_hint = field(DOC_TYPE_FIELDS)
+    if doc_type_hint:
+        doc_type = _classify(doc_type_hint, DOC_TYPE_KEYWORDS) or normalize_facet(doc_type_hint)
+    else:
+        doc_type = _classify(file_path.stem.replace("_", " ") + "\n" + header, DOC_TYPE_KEYWORDS)
+
+    return {
+        "insurer": normalize_facet(insurer) or None,
+        "product": product or None,
+        "doc_type": doc_type or None,
+    }
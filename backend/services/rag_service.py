@@ -1,54 +1,433 @@
 import os
+import copy
 import json
-import pickle
-from typing import List, Dict, Any
-from dataclasses import dataclass
+import shutil
+import hashlib
+from typing import List, Dict, Any, Optional, Set, Tuple
+from dataclasses import dataclass, field, replace
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
 import asyncio
+import time
 from pathlib import Path
 
+from .chunk_store import ChunkStore, ChunkStoreWriter
+from .chunker import StructuredChunker
+from .context_assembler import ContextAssembler
 from .document_loader import DocumentLoader
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache, default_cache_path
+from .index_versions import IndexVersions
+from .lexical_index import LEXICAL_FILES, LexicalIndex, reciprocal_rank_fusion
+from .metrics import add_request_timings, observe_stage, retrieval_score, stage_seconds
+from .near_duplicates import NearDuplicateIndex
+from .onnx_encoder import encoder_id, encoder_settings_from_env, load_onnx_model
+from .policy_metadata import FACETS, METADATA_VERSION, facet_matches
+from .sharded_index import ShardedIndex
+from .index_factory import (
+    build_index,
+    describe_index,
+    index_params_from_env,
+    needs_training,
+    retrain_reason,
+    search_params_from_env,
+)
 
 @dataclass
 class RetrievalResult:
     context: str
     sources: List[str]
     score: float
+    # Normalized query embedding, reused by callers such as the semantic answer cache
+    embedding: Optional[np.ndarray] = None
+    # Seconds spent per retrieval stage (shared by all queries of a batch)
+    timings: Optional[Dict[str, float]] = None
+    # Tokens of the chunks packed into context
+    context_tokens: int = 0
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """The FAISS shards, chunk store and BM25 index of one index version, as queries read them.
+
+    Replaced as a whole, so a query holding a snapshot keeps a consistent
+    set even if a reload swaps in a newer version while it runs.
+    """
+    faiss_index: Optional[ShardedIndex] = None
+    documents: ChunkStore = field(default_factory=ChunkStore)
+    lexical_index: LexicalIndex = field(default_factory=LexicalIndex)
+    # Bumped whenever the served index changes so dependent caches can invalidate
+    version: int = 0
+
+def _serving_field(name: str) -> property:
+    """Service attribute kept on the serving snapshot; assigning it replaces the snapshot"""
+    return property(lambda self: getattr(self.serving, name),
+                    lambda self, value: setattr(self, "serving", replace(self.serving, **{name: value})))
+
+# Initialization states, in order; "failed" if initialize() raised
+INIT_STATES = ("starting", "loading_model", "loading_index", "waiting_for_index", "updating_index", "building_index",
+               "warming_up", "ready")
 
 class FinanceRAGService:
+    faiss_index = _serving_field("faiss_index")
+    documents = _serving_field("documents")
+    lexical_index = _serving_field("lexical_index")
+    index_version = _serving_field("version")
+    
     def __init__(self):
+        self.state = "starting"
+        self.state_since = time.time()
+        self.init_error: Optional[str] = None
         self.embedding_model = None
-        self.faiss_index = None
-        self.documents = []
+        self.serving = IndexSnapshot()
+        self._index_mmapped = False
         self.document_loader = DocumentLoader()
         
         # Configuration for insurance-policy RAG
         self.database_path = os.getenv("DATABASE_PATH", "./database")
         self.faiss_index_path = os.getenv("FAISS_INDEX_PATH", "./database/faiss_index")
+        # Hot reload: DATABASE_PATH is polled every INDEX_WATCH_SECONDS (0 disables) and a changed
+        # database is indexed beside the live index, validated and swapped in; old versions are kept
+        self.index_versions = IndexVersions(self.faiss_index_path, keep=int(os.getenv("INDEX_KEEP_VERSIONS", 3)))
+        self.watch_seconds = float(os.getenv("INDEX_WATCH_SECONDS", 60))
+        # Seconds between attempts at the index lock while another worker builds the index at startup
+        self.startup_lock_poll_seconds = 1.0
+        self.reload_status: Dict[str, Any] = {"state": "idle"}
+        self._reload_lock = asyncio.Lock()
+        # Policy files as of the last reload attempt; the watcher acts when they differ
+        self._database_signature: Optional[Tuple] = None
+        # Files the last update could not parse (timeout or crashed worker), retried by the next one
+        self.unparsed_files: List[str] = []
+        # Version name (from the manifest on disk) of the index being served
+        self.served_version: Optional[str] = None
         self.embedding_model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        # PyTorch or ONNX Runtime (optionally int8) encoder; vectors are cached and indexed under embedding_model_id
+        self.encoder_settings = encoder_settings_from_env()
+        self.embedding_model_id = encoder_id(self.embedding_model_name, self.encoder_settings)
         self.max_results = int(os.getenv("MAX_RESULTS", 5))
+        # Queries encoded per model call by retrieve_documents_batch
+        self.batch_encode_size = int(os.getenv("BATCH_ENCODE_SIZE", 256))
+        # Hybrid retrieval: BM25 over chunk texts fused with vector hits by reciprocal rank
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+        self.rrf_k = int(os.getenv("RRF_K", 60))
+        # Content-addressed embedding cache reused across rebuilds (EMBEDDING_CACHE_MAX_ENTRIES=0 disables it)
+        self.embedding_cache_path = default_cache_path()
+        cache_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 2_000_000))
+        self.embedding_cache = EmbeddingCache(
+            self.embedding_cache_path,
+            max_entries=cache_entries,
+            dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+        ) if cache_entries > 0 else None
+        # Query-time ANN knobs (nprobe for IVF, efSearch for HNSW)
+        self.search_params = search_params_from_env()
+        # Retrain the ANN index on a fresh random sample once the corpus is this many times the size it was
+        # trained for (0 disables); an index that fell back to flat is retrained as soon as it can be
+        self.retrain_growth = float(os.getenv("INDEX_RETRAIN_GROWTH", 2))
+        # One FAISS index per insurer / product / doc_type value so filtered questions search only their shards
+        self.shard_by = os.getenv("SHARD_BY", "insurer").lower()
+        if self.shard_by not in FACETS + ("none",):
+            raise ValueError(f"Unsupported SHARD_BY '{self.shard_by}', expected one of {', '.join(FACETS + ('none',))}")
+        # Section-aware chunking within the embedding model's token limit (0 = model max_seq_length)
+        self.chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", 0))
+        self.chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+        self.chunker = StructuredChunker(max_tokens=self.chunk_max_tokens or 254, overlap_tokens=self.chunk_overlap_tokens)
+        # Near-duplicate chunks (MinHash/LSH) share one vector; DEDUP_THRESHOLD=0 disables collapsing
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", 0.95))
+        self.near_duplicates = NearDuplicateIndex(threshold=self.dedup_threshold)
+        # Streaming ingestion: chunks are embedded and added in fixed-size batches, and progress is
+        # checkpointed so an interrupted build resumes (INGEST_CHECKPOINT_SECONDS=0 saves only at the end)
+        self.ingest_batch_size = max(1, int(os.getenv("INGEST_BATCH_SIZE", 1024)))
+        self.checkpoint_seconds = float(os.getenv("INGEST_CHECKPOINT_SECONDS", 300))
+        self.manifest = self._empty_manifest()
+        # Prompt context: retrieved chunks reranked by MMR and packed up to CONTEXT_TOKEN_BUDGET tokens
+        self.context_assembler = ContextAssembler(
+            lambda text: self.chunker.count_tokens(text),
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500)),
+            mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7)),
+            redundancy_threshold=float(os.getenv("CONTEXT_REDUNDANCY", 0.95))
+        )
+        # Micro-batching of concurrent /ask queries into one encode + search
+        self.query_batcher = EmbeddingBatcher(
+            self._search_queued,
+            window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 5)),
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", 32))
+        )
         
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+    
+    def _set_state(self, state: str):
+        print(f"RAG service: {state} (after {time.time() - self.state_since:.1f}s in {self.state})")
+        self.state = state
+        self.state_since = time.time()
+    
     async def initialize(self):
-        """Initialize insurance RAG service with embeddings and FAISS index"""
-        print("Initializing Finance RAG service for insurance policies...")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
-        if await self._load_existing_index():
+        """Initialize insurance RAG service with embeddings and FAISS index.
+        
+        Blocking work runs in worker threads so the event loop keeps serving
+        /health and /ready while the model loads and the index is built.
+        """
+        try:
+            print("Initializing Finance RAG service for insurance policies...")
+            self._set_state("loading_model")
+            self.embedding_model = await asyncio.to_thread(self._load_embedding_model)
+            # Leave room for the [CLS]/[SEP] tokens the model adds around every chunk
+            model_max_tokens = (getattr(self.embedding_model, "max_seq_length", None) or 256) - 2
+            self.chunker = StructuredChunker(
+                getattr(self.embedding_model, "tokenizer", None),
+                max_tokens=min(self.chunk_max_tokens or model_max_tokens, model_max_tokens),
+                overlap_tokens=self.chunk_overlap_tokens
+            )
+            self._set_state("loading_index")
+            self._database_signature = await asyncio.to_thread(self._scan_database)
+            # Workers starting together build in the same directory: one builds, the rest wait and then
+            # load its result, which is already up to date with the policy files
+            while True:
+                with self.index_versions.lock() as acquired:
+                    if acquired:
+                        await self._open_index()
+                        break
+                if self.state != "waiting_for_index":
+                    self._set_state("waiting_for_index")
+                await asyncio.sleep(self.startup_lock_poll_seconds)
+            self.served_version = self.index_versions.active_version()
+            self._set_state("warming_up")
+            await asyncio.to_thread(self._warm_up)
+            self._set_state("ready")
+        except Exception as e:
+            self.init_error = str(e)
+            self._set_state("failed")
+            raise
+    
+    async def _open_index(self):
+        """Load the index on disk and bring it up to date, or build it; validated before it is served"""
+        if self.state != "loading_index":
+            self._set_state("loading_index")
+        if await asyncio.to_thread(self._load_existing_index):
             print("Loaded existing FAISS index")
+            self._set_state("updating_index")
+            await self._update_index()
         else:
+            self._set_state("building_index")
             await self._build_new_index()
             print("Built new FAISS index")
+        # An empty policy folder is allowed at startup; anything indexed has to be servable
+        if len(self.documents):
+            problems = await asyncio.to_thread(self._validate_index)
+            if problems:
+                raise RuntimeError("index failed validation: " + "; ".join(problems))
+    
+    def _load_embedding_model(self):
+        # Importing sentence_transformers pulls in torch, so it happens here rather than at import time
+        from sentence_transformers import SentenceTransformer
+        if self.encoder_settings["backend"] == "onnx":
+            try:
+                return load_onnx_model(self.embedding_model_name, self.encoder_settings)
+            except (ImportError, TypeError) as e:
+                # TypeError: sentence-transformers before 3.2 has no backend argument
+                print(f"ONNX Runtime not available ({e}); using the PyTorch encoder. "
+                      "Install sentence-transformers[onnx]>=3.2 for EMBEDDING_BACKEND=onnx")
+                self.embedding_model_id = self.embedding_model_name
+        return SentenceTransformer(self.embedding_model_name)
+    
+    def _warm_up(self):
+        """Run one encode + search so the first real query does not pay for lazy initialization"""
+        if self.faiss_index is not None and self.faiss_index.ntotal > 0:
+            self._search_batch(["What does this insurance policy cover?"])
+        else:
+            self._embed_texts(["What does this insurance policy cover?"])
+    
+    async def watch_database(self):
+        """Poll DATABASE_PATH and reload the index once a change has settled.
+        
+        A change is acted on after one more poll sees the same files, so a copy
+        still in progress is not indexed half-written. Each poll also picks up
+        a version activated by another worker process or a rollback.
+        """
+        if self.watch_seconds <= 0:
+            return
+        previous = None
+        while True:
+            await asyncio.sleep(self.watch_seconds)
+            try:
+                async with self._reload_lock:
+                    await self._sync_active_version()
+                signature = await asyncio.to_thread(self._scan_database)
+                if signature != self._database_signature and signature == previous:
+                    print("Policy database changed; reloading the index")
+                    await self.reload_index("watch")
+                previous = signature
+            except Exception as e:
+                print(f"Error watching the policy database: {e}")
+    
+    async def reload_index(self, trigger: str = "admin") -> Dict[str, Any]:
+        """Index changes to DATABASE_PATH beside the live index, validate the result and swap it in.
+        
+        Queries keep reading the live snapshot throughout and switch to the new
+        one in a single assignment. If building or validation fails, the live
+        index stays in place and the failure is reported in reload_status.
+        """
+        if not self.ready:
+            return {"state": "skipped", "reason": f"service is {self.state}"}
+        async with self._reload_lock:
+            with self.index_versions.lock() as acquired:
+                if not acquired:
+                    return {"state": "skipped", "reason": "another worker is reloading the index"}
+                self.reload_status = {"state": "building", "trigger": trigger, "started_at": time.time()}
+                staging = None
+                signature = None
+                try:
+                    await self._sync_active_version()
+                    signature = await asyncio.to_thread(self._scan_database)
+                    staging = await asyncio.to_thread(self.index_versions.staging)
+                    builder = await self._fork_builder(staging)
+                    await builder._update_index()
+                    if builder.index_version == self.index_version:
+                        self._database_signature = signature
+                        self._finish_reload("up_to_date")
+                        return self.reload_status
+                    self.reload_status["state"] = "validating"
+                    problems = await asyncio.to_thread(builder._validate_index)
+                    if problems:
+                        raise RuntimeError("new index failed validation: " + "; ".join(problems))
+                    self.reload_status["state"] = "swapping"
+                    archived = await asyncio.to_thread(self.index_versions.activate, staging)
+                    await self._load_active_version()
+                    await asyncio.to_thread(self.index_versions.prune)
+                    self._database_signature = signature
+                    self._finish_reload("swapped", version=self.served_version, archived=archived,
+                                        chunks=len(self.documents), unparsed_files=builder.unparsed_files)
+                    print(f"Swapped in index version {self.served_version} ({len(self.documents)} chunks)")
+                except Exception as e:
+                    print(f"Index reload failed, still serving version {self.served_version}: {e}")
+                    self._finish_reload("failed", error=str(e))
+                    # The watcher retries only after the files change again; /admin/reindex retries at once
+                    self._database_signature = signature or self._database_signature
+                finally:
+                    if staging is not None:
+                        shutil.rmtree(staging, ignore_errors=True)
+                return self.reload_status
     
-    async def _load_existing_index(self) -> bool:
-        """Try to load existing FAISS index and insurance policy documents"""
+    async def rollback_index(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """Swap an archived version (the most recent by default) back in; the serving one is archived in turn.
+        
+        Raises ValueError for an unknown version and RuntimeError if another
+        reload is in progress or the archived version cannot be loaded.
+        """
+        async with self._reload_lock:
+            with self.index_versions.lock() as acquired:
+                if not acquired:
+                    raise RuntimeError("another worker is reloading the index")
+                archived = [entry["version"] for entry in self.index_versions.archived()]
+                if version is None:
+                    if not archived:
+                        raise ValueError("no archived index versions to roll back to")
+                    version = archived[0]
+                elif version not in archived:
+                    raise ValueError(f"unknown index version '{version}'")
+                previous = await asyncio.to_thread(self.index_versions.activate, self.index_versions.versions_dir / version)
+                try:
+                    await self._load_active_version()
+                except Exception:
+                    if previous is not None:
+                        await asyncio.to_thread(self.index_versions.activate, self.index_versions.versions_dir / previous)
+                        await self._load_active_version()
+                    raise
+                print(f"Rolled back to index version {self.served_version}")
+                self.reload_status = {"state": "rolled_back", "trigger": "rollback", "finished_at": time.time(),
+                                      "version": self.served_version, "archived": previous}
+                return self.reload_status
+    
+    def index_status(self) -> Dict[str, Any]:
+        """Served and archived index versions and the outcome of the last reload"""
+        return {
+            "served_version": self.served_version,
+            "index_version": self.index_version,
+            "chunks": len(self.documents),
+            "archived_versions": self.index_versions.archived(),
+            "reload": self.reload_status,
+        }
+    
+    def _finish_reload(self, state: str, **details: Any):
+        self.reload_status.update(state=state, finished_at=time.time(), **details)
+    
+    async def _fork_builder(self, staging: Path) -> "FinanceRAGService":
+        """A shallow copy of the service that updates a private copy of the live index and saves it to staging.
+        
+        It shares the model, chunker and embedding cache but replaces every
+        piece of index state it modifies, so the live snapshot is never touched.
+        """
+        builder = copy.copy(self)
+        if self.faiss_index is not None:
+            builder.faiss_index = await asyncio.to_thread(builder._read_faiss_index, False)
+        builder.manifest = copy.deepcopy(self.manifest)
+        await asyncio.to_thread(builder._load_near_duplicates)
+        builder.faiss_index_path = str(staging)
+        return builder
+    
+    def _validate_index(self) -> List[str]:
+        """Problems that make a freshly built index unfit to serve; empty if it can be swapped in"""
+        directory = Path(self.faiss_index_path)
+        if not (ShardedIndex.exists(directory) and ChunkStore.exists(directory) and (directory / "manifest.json").exists()):
+            return ["index files were not all saved"]
+        if self.faiss_index is None or not len(self.documents):
+            return ["no policy chunks were indexed"]
+        problems = []
+        if self.faiss_index.ntotal != len(self.documents):
+            problems.append(f"{self.faiss_index.ntotal} vectors for {len(self.documents)} chunks")
+        if self.hybrid_search and len(self.lexical_index) != len(self.documents):
+            problems.append(f"BM25 index covers {len(self.lexical_index)} of {len(self.documents)} chunks")
+        # One query end to end; every hit has to resolve to a stored chunk
+        for chunk_ids, *_ in self._search_batch(["What does this insurance policy cover?"]):
+            if not chunk_ids or any(chunk_id not in self.documents for chunk_id in chunk_ids):
+                problems.append("a test query returned chunks missing from the chunk store")
+        return problems
+    
+    async def _sync_active_version(self):
+        """Serve the version on disk if another worker process swapped it in"""
+        active = await asyncio.to_thread(self.index_versions.active_version)
+        if active is not None and active != self.served_version:
+            print(f"Index version {active} was activated by another process; loading it")
+            await self._load_active_version()
+    
+    async def _load_active_version(self):
+        """Load the index in FAISS_INDEX_PATH into a new snapshot and serve it from the next query on"""
+        loader = copy.copy(self)
+        if not await asyncio.to_thread(loader._load_existing_index):
+            raise RuntimeError("the active index could not be loaded")
+        # Fault in the new memory maps before queries reach them
+        await asyncio.to_thread(loader._warm_up)
+        loader.index_version = self.index_version + 1
+        self.manifest = loader.manifest
+        self.near_duplicates = loader.near_duplicates
+        self._index_mmapped = True
+        self.served_version = self.index_versions.active_version()
+        self.serving = loader.serving
+    
+    def _load_existing_index(self) -> bool:
+        """Try to load existing FAISS index, its manifest and insurance policy documents"""
         try:
-            index_file = Path(self.faiss_index_path) / "index.faiss"
-            docs_file = Path(self.faiss_index_path) / "documents.pkl"
-            if index_file.exists() and docs_file.exists():
-                self.faiss_index = faiss.read_index(str(index_file))
-                with open(docs_file, 'rb') as f:
-                    self.documents = pickle.load(f)
+            manifest_file = Path(self.faiss_index_path) / "manifest.json"
+            if ShardedIndex.exists(self.faiss_index_path) and ChunkStore.exists(self.faiss_index_path) and manifest_file.exists():
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get("embedding_model") != self.embedding_model_id:
+                    print("Embedding model changed since the index was built; rebuilding")
+                    return False
+                params = index_params_from_env()
+                if manifest.get("index", {}).get("requested_type") != params["type"]:
+                    print(f"FAISS_INDEX_TYPE changed to {params['type']}; rebuilding")
+                    return False
+                if manifest.get("index", {}).get("encoding", "float32") != params["encoding"]:
+                    print(f"VECTOR_ENCODING changed to {params['encoding']}; rebuilding")
+                    return False
+                if manifest.get("chunking") != self._chunking_params():
+                    print("Chunking settings changed since the index was built; rebuilding")
+                    return False
+                self.faiss_index = self._read_faiss_index(mmap=True)
+                self.documents = ChunkStore(self.faiss_index_path)
+                self.lexical_index = LexicalIndex.load(self.faiss_index_path) or self._build_lexical_index()
+                self._load_near_duplicates()
+                self.manifest = manifest
                 return True
         except Exception as e:
             print(f"Error loading existing index: {e}")
@@ -56,88 +435,568 @@ class FinanceRAGService:
     
     async def _build_new_index(self):
         """Build a new FAISS index from insurance policy documents"""
-        documents_data = await self.document_loader.load_all_documents(self.database_path)
-        if not documents_data:
+        self.faiss_index = None
+        self.documents = ChunkStore()
+        self.lexical_index = LexicalIndex()
+        self.near_duplicates = NearDuplicateIndex(threshold=self.dedup_threshold)
+        self.manifest = self._empty_manifest()
+        if not await self._update_index():
             print("No insurance policy documents found to build index")
-            return
+    
+    def _list_policy_files(self) -> List[Path]:
+        # The index directory (with archived versions and reload staging), the caches and ONNX exports are not policies
+        return self.document_loader.list_document_files(
+            self.database_path, exclude=[str(self.index_versions.root), self.embedding_cache_path,
+                                         self.encoder_settings["path"]]
+        )
+    
+    def _diff_database(self) -> Tuple[Dict[str, Path], Dict[str, str], List[str], List[str]]:
+        """Policy files with their content hashes, and the indexed files since removed or changed"""
+        current = {self._relative_path(path): path for path in self._list_policy_files()}
+        indexed = self.manifest["files"]
+        file_hashes = {rel: self._hash_file(path) for rel, path in current.items()}
+        removed = [rel for rel in indexed if rel not in current]
+        changed = [rel for rel in current if rel not in indexed or indexed[rel]["hash"] != file_hashes[rel]]
+        return current, file_hashes, removed, changed
+    
+    def _scan_database(self) -> Tuple[Tuple[str, int, int], ...]:
+        """Paths, sizes and modification times of the policy files; cheap enough to poll"""
+        signature = []
+        for path in self._list_policy_files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+    
+    async def _update_index(self) -> bool:
+        """Bring the index in line with DATABASE_PATH, re-embedding only added or changed files"""
+        # Hashing every policy file is disk-bound; keep it off the event loop that serves queries during a reload
+        current, file_hashes, removed, changed = await asyncio.to_thread(self._diff_database)
+        indexed = self.manifest["files"]
+        if not removed and not changed and self._retrain_reason() is None:
+            print("FAISS index is up to date with the policy database")
+            return len(self.documents) > 0
+        print(f"Updating FAISS index: {len(changed)} added/changed, {len(removed)} removed policy files")
+        if self.faiss_index is not None and self._index_mmapped:
+            # The serving copy is a read-only memory map; load a private copy to modify
+            self.faiss_index = await asyncio.to_thread(self._read_faiss_index, False)
+        
+        # Drop vectors for deleted files and for the previous version of changed files
+        stale_files = removed + [rel for rel in changed if rel in indexed]
+        stale_ids = []
+        for rel in stale_files:
+            start, end = indexed[rel]["ids"]
+            stale_ids.extend(range(start, end))
+        stale_id_set = set(stale_ids)
+        # Unchanged files whose chunks were collapsed into a stale chunk must be re-chunked to own them again
+        orphaned = [
+            rel for rel, entry in indexed.items()
+            if rel not in stale_files and rel in current
+            and any(chunk_id in stale_id_set for chunk_id, _ in entry.get("refs", []))
+        ]
+        for rel in orphaned:
+            start, end = indexed[rel]["ids"]
+            stale_ids.extend(range(start, end))
+            stale_id_set.update(range(start, end))
+        changed = changed + orphaned
+        # Source aliases to drop from surviving chunks because the file that referenced them is gone
+        unlinked_refs: Dict[int, Set[str]] = {}
+        for rel in stale_files + orphaned:
+            for chunk_id, source in indexed.pop(rel).get("refs", []):
+                unlinked_refs.setdefault(chunk_id, set()).add(source)
+        if stale_ids and self.faiss_index is not None:
+            await asyncio.to_thread(self.faiss_index.remove_ids, np.array(stale_ids, dtype='int64'))
+        self.near_duplicates.remove(stale_id_set)
+        # Surviving chunks keep their BM25 postings; a missing or mismatched index is rebuilt in full
+        lexical_base = None
+        if len(self.lexical_index) == len(self.documents):
+            lexical_base = (self.lexical_index, stale_id_set, self.manifest["next_id"])
+        
+        # Surviving chunks go first: new chunk IDs are always above them, so appending keeps the store sorted
+        writer = ChunkStoreWriter(self.faiss_index_path)
+        await asyncio.to_thread(self._copy_chunks, writer, stale_id_set, unlinked_refs)
+        self.manifest["chunking"] = self._chunking_params()
+        
+        # File -> chunks -> fixed-size embedding batches -> index and chunk store. The loader parses only
+        # a few files ahead, so memory stays bounded by the batch size rather than the corpus size.
+        batch_texts: List[str] = []
+        batch_ids: List[int] = []
+        batch_keys: List[str] = []
+        untrained: List[Tuple[np.ndarray, np.ndarray, List[str]]] = []
+        collapsed = 0
+        last_checkpoint = time.monotonic()
+        
+        async def flush_batch(label: str):
+            nonlocal batch_texts, batch_ids, batch_keys
+            if batch_texts:
+                texts, ids, keys = batch_texts, np.array(batch_ids, dtype='int64'), batch_keys
+                batch_texts, batch_ids, batch_keys = [], [], []
+                embeddings = await asyncio.to_thread(self._embed_chunks, texts, label)
+                await self._add_vectors(embeddings, ids, keys, untrained)
+        
+        position = 0
+        self.unparsed_files = []
+        async for documents_data in self.document_loader.iter_files([current[rel] for rel in changed]):
+            rel = changed[position]
+            position += 1
+            if documents_data is None:
+                # Timed out or its parser crashed: left out of the manifest, so the next update tries it again
+                self.unparsed_files.append(rel)
+                continue
+            start = self.manifest["next_id"]
+            texts, keys, refs, file_collapsed = await asyncio.to_thread(self._chunk_file, documents_data, start, writer)
+            collapsed += file_collapsed
+            for offset, (text, key) in enumerate(zip(texts, keys)):
+                batch_texts.append(text)
+                batch_ids.append(start + offset)
+                batch_keys.append(key)
+                if len(batch_texts) >= self.ingest_batch_size:
+                    await flush_batch(f"a batch up to {rel}")
+            self.manifest["next_id"] = start + len(texts)
+            indexed[rel] = {"hash": file_hashes[rel], "ids": [start, start + len(texts)], "refs": refs}
+            
+            if self.checkpoint_seconds > 0 and time.monotonic() - last_checkpoint >= self.checkpoint_seconds:
+                await flush_batch(f"a batch up to {rel}")
+                # An IVF index still collecting its training sample has nothing to checkpoint yet
+                if self.faiss_index is not None:
+                    print(f"Checkpointing after {position} of {len(changed)} files ({len(writer)} chunks)")
+                    await asyncio.to_thread(self._save_index, writer, False)
+                last_checkpoint = time.monotonic()
+        await flush_batch("the final batch")
+        await self._add_vectors(None, None, None, untrained)
+        if self.unparsed_files:
+            print(f"Could not parse {len(self.unparsed_files)} policy files; they will be retried on the next update: "
+                  + ", ".join(self.unparsed_files))
+        if collapsed:
+            print(f"Collapsed {collapsed} near-duplicate chunks into existing ones")
+        reason = self._retrain_reason()
+        if reason is not None:
+            # Checkpoint first: the retrain reads the complete chunk store, and a crash keeps the old training
+            await asyncio.to_thread(self._save_index, writer, False)
+            await self._retrain_index(reason)
+        if self.faiss_index is not None:
+            self.faiss_index.apply_search_params(self.search_params)
+        
+        await asyncio.to_thread(self._save_index, writer, True, lexical_base)
+        self.index_version += 1
+        return len(self.documents) > 0
+    
+    def _copy_chunks(self, writer: ChunkStoreWriter, stale_ids: Set[int], unlinked_refs: Dict[int, Set[str]]):
+        for chunk_id, record in self.documents.items(skip_ids=stale_ids):
+            writer.append(chunk_id, self._unlink_sources(chunk_id, record, unlinked_refs))
+    
+    def _chunk_file(self, documents_data: List[Dict[str, Any]], start: int,
+                    writer: ChunkStoreWriter) -> Tuple[List[str], List[str], List[List[Any]], int]:
+        """Chunk one file, append its new chunks to the store and link its near-duplicates.
         
+        Returns the texts to embed (chunk IDs from start upwards) with their shard
+        keys, the file's refs to chunks owned by other files and the number of
+        collapsed chunks.
+        """
         texts = []
-        metadata = []
+        keys = []
+        refs = []
+        collapsed = 0
         for doc in documents_data:
-            chunks = self._chunk_document(doc["content"], chunk_size=512, overlap=50)
-            for i, chunk in enumerate(chunks):
-                texts.append(chunk)
-                metadata.append({
+            metadata = {facet: doc.get(facet) for facet in FACETS}
+            for i, chunk in enumerate(self._chunk_document(doc["content"])):
+                if self.dedup_threshold > 0:
+                    # Only chunks with the same metadata are collapsed, so filtered searches still find them
+                    signature = self.near_duplicates.signature(chunk, self._dedup_namespace(metadata))
+                    duplicate_of = self.near_duplicates.find(signature)
+                    if duplicate_of is not None:
+                        # Point at the existing chunk instead of storing another vector for boilerplate
+                        if duplicate_of < start and [duplicate_of, doc["source"]] not in refs:
+                            refs.append([duplicate_of, doc["source"]])
+                        writer.link_sources(duplicate_of, [doc["source"]])
+                        collapsed += 1
+                        continue
+                    self.near_duplicates.add(start + len(texts), signature)
+                writer.append(start + len(texts), {
                     "source": doc["source"],
                     "chunk_id": i,
-                    "content": chunk
+                    "content": chunk,
+                    **metadata
                 })
+                texts.append(chunk)
+                keys.append(self._shard_key(metadata))
+        return texts, keys, refs, collapsed
+    
+    def _shard_key(self, metadata: Dict[str, Any]) -> str:
+        """Shard of a chunk: its SHARD_BY value, "" if unknown or unsharded"""
+        return "" if self.shard_by == "none" else (metadata.get(self.shard_by) or "")
+    
+    @staticmethod
+    def _dedup_namespace(metadata: Dict[str, Any]) -> str:
+        return "|".join(metadata.get(facet) or "" for facet in FACETS).strip("|")
+    
+    async def _add_vectors(self, embeddings: Optional[np.ndarray], ids: Optional[np.ndarray], keys: Optional[List[str]],
+                           untrained: List[Tuple[np.ndarray, np.ndarray, List[str]]]):
+        """Add a batch of vectors to their shards, creating the index first if needed.
+        
+        IVF and 8-bit indexes are only created once INDEX_TRAIN_SAMPLE vectors are buffered
+        (or input ends, signalled by embeddings=None) so training sees a full sample.
+        """
+        if self.faiss_index is not None:
+            if embeddings is not None:
+                await asyncio.to_thread(self.faiss_index.add_with_ids, embeddings, ids, keys)
+            return
+        if embeddings is not None:
+            untrained.append((embeddings, ids, keys))
+        params = index_params_from_env()
+        buffered = sum(len(batch_ids) for _, batch_ids, _ in untrained)
+        if not buffered:
+            return
+        if embeddings is not None and needs_training(params) and buffered < params["train_sample"]:
+            return
+        sample = np.concatenate([batch for batch, _, _ in untrained])
+        sample_ids = np.concatenate([batch_ids for _, batch_ids, _ in untrained])
+        sample_keys = [key for _, _, batch_keys in untrained for key in batch_keys]
+        untrained.clear()
+        # ID-mapped shards so a file's vectors can be removed by chunk ID; all cloned from one trained template
+        self.manifest["index"] = params
+        self.faiss_index = ShardedIndex(await asyncio.to_thread(build_index, params, sample))
+        self.faiss_index.apply_search_params(self.search_params)
+        print(f"Created {describe_index(params)} FAISS index" + (f" sharded by {self.shard_by}" if self.shard_by != "none" else ""))
+        await asyncio.to_thread(self.faiss_index.add_with_ids, sample, sample_ids, sample_keys)
+    
+    def _retrain_reason(self) -> Optional[str]:
+        if self.faiss_index is None or "index" not in self.manifest:
+            return None
+        return retrain_reason(self.manifest["index"], self.faiss_index.ntotal, self.retrain_growth)
+    
+    async def _retrain_index(self, reason: str):
+        """Rebuild the FAISS index trained on a uniform random sample of all chunks, sized for the whole corpus.
         
-        print(f"Generating embeddings for {len(texts)} insurance policy chunks...")
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=True)
+        Vectors come back through _embed_chunks, so with the embedding cache
+        nothing is re-encoded. The chunk store and chunk IDs are unchanged.
+        """
+        print(f"Retraining the FAISS index: {reason}")
+        store = ChunkStore(self.faiss_index_path)
+        try:
+            ids = np.asarray(store.ids, dtype='int64')
+            params = index_params_from_env()
+            rng = np.random.default_rng(1234)
+            sample_ids = np.sort(rng.choice(ids, size=min(len(ids), params["train_sample"]), replace=False))
+            sample = await asyncio.to_thread(
+                self._embed_chunks, [store.get(int(chunk_id))["content"] for chunk_id in sample_ids], "the training sample")
+            index = ShardedIndex(await asyncio.to_thread(build_index, params, sample, len(ids)))
+            index.apply_search_params(self.search_params)
+            for begin in range(0, len(ids), self.ingest_batch_size):
+                batch_ids = ids[begin:begin + self.ingest_batch_size]
+                records = [store.get(int(chunk_id)) for chunk_id in batch_ids]
+                embeddings = await asyncio.to_thread(
+                    self._embed_chunks, [record["content"] for record in records], f"chunks {begin}+ for retraining")
+                await asyncio.to_thread(index.add_with_ids, embeddings, batch_ids, [self._shard_key(record) for record in records])
+        finally:
+            store.close()
+        self.faiss_index = index
+        self.manifest["index"] = params
+        print(f"Retrained as a {describe_index(params)} FAISS index")
+    
+    def _embed_chunks(self, texts: List[str], label: str) -> np.ndarray:
+        """Embed chunk texts, reusing vectors cached from earlier builds and encoding only misses"""
+        if self.embedding_cache is None:
+            print(f"Generating embeddings for {len(texts)} chunks of {label}...")
+            return self._embed_texts(texts, show_progress_bar=True)
+        embeddings, misses = self.embedding_cache.lookup(self.embedding_model_id, texts)
+        print(f"Generating embeddings for {len(misses)} of {len(texts)} chunks of {label} ({len(texts) - len(misses)} cached)...")
+        if misses:
+            miss_texts = [texts[position] for position in misses]
+            encoded = self._embed_texts(miss_texts, show_progress_bar=True)
+            self.embedding_cache.store(self.embedding_model_id, miss_texts, encoded)
+            if embeddings is None:
+                return encoded
+            embeddings[misses] = encoded
+        return embeddings
+    
+    def _embed_texts(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """Encode texts into L2-normalized float32 embeddings for inner-product search"""
+        embeddings = self.embedding_model.encode(texts, show_progress_bar=show_progress_bar)
         # sentence-transformers may return a list; convert to numpy array
         if not isinstance(embeddings, np.ndarray):
             embeddings = np.array(embeddings)
         # Ensure embeddings are 2D
         if embeddings.ndim == 1:
             embeddings = np.expand_dims(embeddings, 0)
-        dimension = embeddings.shape[1]
-        # create inner-product index and normalize embeddings for cosine similarity
-        self.faiss_index = faiss.IndexFlatIP(dimension)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        import faiss
         try:
             faiss.normalize_L2(embeddings)
         except Exception:
             # normalize manually if FAISS normalize fails
             norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
             norms[norms == 0] = 1.0
-            embeddings = embeddings / norms
-        self.faiss_index.add(embeddings.astype('float32'))
-        self.documents = metadata
-        await self._save_index()
+            embeddings = (embeddings / norms).astype('float32')
+        return embeddings
     
-    async def _save_index(self):
-        """Save FAISS index and insurance policy metadata to disk"""
-        try:
-            os.makedirs(self.faiss_index_path, exist_ok=True)
-            index_file = Path(self.faiss_index_path) / "index.faiss"
-            faiss.write_index(self.faiss_index, str(index_file))
-            docs_file = Path(self.faiss_index_path) / "documents.pkl"
-            with open(docs_file, 'wb') as f:
-                pickle.dump(self.documents, f)
+    def _empty_manifest(self) -> Dict[str, Any]:
+        """Manifest of per-file content hashes, the chunk ID range each file owns and its near-duplicate refs"""
+        return {"embedding_model": self.embedding_model_id, "chunking": self._chunking_params(), "next_id": 0, "files": {}}
+    
+    def _chunking_params(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.chunker.max_tokens,
+            "overlap_tokens": self.chunker.overlap_tokens,
+            "dedup_threshold": self.dedup_threshold,
+            # Indexes collapsed before numbers were part of the match are rebuilt
+            "dedup_match": "metadata+numbers",
+            # Indexes citing bare file names, which collide across insurer folders, are rebuilt
+            "source_names": "relative_path",
+            "shard_by": self.shard_by,
+            "metadata_version": METADATA_VERSION,
+        }
+    
+    def _relative_path(self, file_path: Path) -> str:
+        return file_path.relative_to(self.database_path).as_posix()
+    
+    @staticmethod
+    def _hash_file(file_path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _read_faiss_index(self, mmap: bool) -> ShardedIndex:
+        """Read the persisted FAISS shards, memory-mapped read-only when serving"""
+        index = ShardedIndex.load(self.faiss_index_path, mmap=mmap)
+        self._index_mmapped = mmap
+        index.apply_search_params(self.search_params)
+        return index
+    
+    def _build_lexical_index(self, base: Optional[Tuple[LexicalIndex, Set[int], int]] = None) -> LexicalIndex:
+        """Build and persist the BM25 index of the chunk store.
+        
+        base is the index of the previous chunk store, the chunk IDs removed since
+        and the first new chunk ID; only the chunks from that ID on are tokenized.
+        """
+        if base is None:
+            print(f"Building BM25 index over {len(self.documents)} chunks...")
+            self.lexical_index = LexicalIndex.build((chunk_id, record["content"]) for chunk_id, record in self.documents.items())
+        else:
+            previous, removed_ids, first_new_id = base
+            self.lexical_index = previous.update(
+                removed_ids, ((chunk_id, record["content"]) for chunk_id, record in self.documents.items(start_id=first_new_id))
+            )
+        self.lexical_index.save(self.faiss_index_path)
+        return self.lexical_index
+    
+    def _load_near_duplicates(self):
+        """Load MinHash signatures of indexed chunks, recomputing them from the chunk store if missing"""
+        self.near_duplicates = NearDuplicateIndex(threshold=self.dedup_threshold)
+        if self.dedup_threshold <= 0:
+            return
+        saved = NearDuplicateIndex.saved(self.faiss_index_path)
+        if saved is None:
+            print(f"Computing MinHash signatures for {len(self.documents)} chunks...")
+            ids, signatures = [], []
+            for chunk_id, record in self.documents.items():
+                ids.append(chunk_id)
+                signatures.append(self.near_duplicates.signature(record["content"], self._dedup_namespace(record)))
+            saved = (np.array(ids, dtype='int64'),
+                     np.stack(signatures) if signatures else np.empty((0, self.near_duplicates.num_perm), dtype='uint32'))
+        self.near_duplicates.load(*saved)
+    
+    def _save_index(self, writer: ChunkStoreWriter, final: bool,
+                    lexical_base: Optional[Tuple[LexicalIndex, Set[int], int]] = None):
+        """Save FAISS index, the chunk store written so far, then the file manifest.
+        
+        A checkpoint (final=False) leaves a consistent index of the files finished
+        so far and keeps the writer open; an interrupted build resumes from it.
+        Failures propagate, so a build never ends with a stale BM25 index.
+        """
+        os.makedirs(self.faiss_index_path, exist_ok=True)
+        # Remove the manifest first so a crash mid-save forces a rebuild instead of a mismatched index
+        manifest_file = Path(self.faiss_index_path) / "manifest.json"
+        manifest_file.unlink(missing_ok=True)
+        if self.faiss_index is not None:
+            self.faiss_index.save(self.faiss_index_path)
+            # Single-file index from before sharding
+            (Path(self.faiss_index_path) / "index.faiss").unlink(missing_ok=True)
+        if final:
+            self.documents = writer.close()
+            self._build_lexical_index(lexical_base)
+        else:
+            writer.checkpoint()
+            # Rebuilt from the chunk store if the build is resumed from this checkpoint
+            for name in LEXICAL_FILES:
+                (Path(self.faiss_index_path) / name).unlink(missing_ok=True)
+        if self.dedup_threshold > 0:
+            self.near_duplicates.save(self.faiss_index_path)
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
+        if final:
+            self.manifest["version"] = IndexVersions.new_version()
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        if final:
             print("Saved FAISS index and insurance policy documents")
-        except Exception as e:
-            print(f"Error saving index: {e}")
-    
-    def _chunk_document(self, text: str, chunk_size: int = 512, overlap: int = 50) -> List[str]:
-        """Split insurance policy document into overlapping chunks"""
-        words = text.split()
-        chunks = []
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk_words = words[i:i + chunk_size]
-            if len(chunk_words) > 0:
-                chunks.append(" ".join(chunk_words))
-        return chunks
-    
-    async def retrieve_documents(self, query: str) -> RetrievalResult:
-        """Retrieve relevant insurance policy sections for a query"""
-        if not self.faiss_index or not self.embedding_model:
-            return RetrievalResult(context="", sources=[], score=0.0)
-        query_embedding = self.embedding_model.encode([query])
-        faiss.normalize_L2(query_embedding)
-        scores, indices = self.faiss_index.search(query_embedding.astype('float32'), self.max_results)
-        if len(scores[0]) == 0:
+    
+    @staticmethod
+    def _unlink_sources(chunk_id: int, record: Dict[str, Any], unlinked_refs: Dict[int, Set[str]]) -> Dict[str, Any]:
+        """Drop near-duplicate source aliases of files removed or changed by this update from one chunk record"""
+        if chunk_id not in unlinked_refs:
+            return record
+        removed = unlinked_refs[chunk_id]
+        return {**record, "sources": [record["source"]] + [source for source in record["sources"][1:] if source not in removed]}
+    
+    def _chunk_document(self, text: str) -> List[str]:
+        """Split insurance policy document at section and clause boundaries within the model's token limit"""
+        return self.chunker.chunk(text)
+    
+    async def retrieve_documents(self, query: str, policy_filter: Optional[Dict[str, str]] = None) -> RetrievalResult:
+        """Retrieve relevant insurance policy sections for a query, optionally only from matching policies"""
+        if not self.serving.faiss_index or not self.embedding_model:
             return RetrievalResult(context="", sources=[], score=0.0)
-        top_score = float(scores[0][0])
-        retrieved_chunks = []
-        sources = set()
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx]
-                retrieved_chunks.append(doc["content"])
-                sources.add(doc["source"])
-        context = "\n\n".join(retrieved_chunks[:3])
+        # Concurrent queries are encoded and searched together by the batcher
+        started = time.perf_counter()
+        result = await self.query_batcher.submit((query, self._filter_key(policy_filter)))
+        elapsed = time.perf_counter() - started
+        # Time not spent encoding, searching or assembling went to waiting for (or behind) a batch
+        observe_stage("batch_queue", max(0.0, elapsed - sum(result.timings.values())))
+        add_request_timings(result.timings)
+        retrieval_score.observe(result.score)
+        return result
+    
+    async def retrieve_documents_batch(self, queries: List[str],
+                                       policy_filter: Optional[Dict[str, str]] = None) -> List[RetrievalResult]:
+        """Retrieve policy sections for many queries with chunked encoding and one FAISS search"""
+        if not queries:
+            return []
+        if not self.serving.faiss_index or not self.embedding_model:
+            return [RetrievalResult(context="", sources=[], score=0.0) for _ in queries]
+        filters = [self._filter_key(policy_filter)] * len(queries)
+        results = await asyncio.to_thread(self._retrieve_batch, queries, self.batch_encode_size, filters)
+        # Encoding and search ran once for the whole batch; assembly ran per query
+        add_request_timings({stage: seconds for stage, seconds in results[0].timings.items() if stage != "assemble"})
+        add_request_timings({"assemble": sum(result.timings["assemble"] for result in results)})
+        for result in results:
+            retrieval_score.observe(result.score)
+        return results
+    
+    @staticmethod
+    def _filter_key(policy_filter: Optional[Dict[str, str]]) -> Optional[Tuple[Tuple[str, str], ...]]:
+        """Hashable form of an insurer / product / doc_type filter; None when nothing is filtered"""
+        if not policy_filter:
+            return None
+        unknown = set(policy_filter) - set(FACETS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+        return tuple(sorted((facet, value) for facet, value in policy_filter.items() if value)) or None
+    
+    def _resolve_filter(self, serving: IndexSnapshot,
+                        filter_key: Tuple[Tuple[str, str], ...]) -> Tuple[Optional[List[str]], np.ndarray, Optional[np.ndarray]]:
+        """Shards to search, a chunk-row mask for BM25, and the allowed chunk IDs if shards alone do not filter"""
+        mask = np.ones(len(serving.documents), dtype=bool)
+        for facet, value in filter_key:
+            mask &= serving.documents.facet_mask(facet, lambda stored, wanted=value: facet_matches(wanted, stored))
+        filtered = dict(filter_key)
+        shard_keys = None
+        if self.shard_by in filtered:
+            shard_keys = [key for key in serving.faiss_index.shards if key and facet_matches(filtered[self.shard_by], key)]
+        # Every vector in a matching shard passes a filter on the shard field alone
+        allowed_ids = None if set(filtered) == {self.shard_by} else np.asarray(serving.documents.ids)[mask]
+        return shard_keys, mask, allowed_ids
+    
+    def _search_queued(self, items: List[Tuple[str, Optional[Tuple[Tuple[str, str], ...]]]]) -> List[RetrievalResult]:
+        """EmbeddingBatcher callback: (query, filter key) pairs searched as one batch"""
+        return self._retrieve_batch([query for query, _ in items], filters=[filter_key for _, filter_key in items])
+    
+    def _retrieve_batch(self, queries: List[str], encode_batch_size: Optional[int] = None,
+                        filters: Optional[List[Optional[Tuple[Tuple[str, str], ...]]]] = None) -> List[RetrievalResult]:
+        """Search a batch and pack each query's context in the calling worker thread, off the event loop"""
+        results = []
+        for chunk_ids, score, embedding, timings, serving in self._search_batch(queries, encode_batch_size, filters):
+            started = time.perf_counter()
+            result = self._build_retrieval_result(serving, chunk_ids, score, embedding)
+            assembled = time.perf_counter() - started
+            stage_seconds.observe(assembled, "assemble")
+            result.timings = {**timings, "assemble": assembled}
+            results.append(result)
+        return results
+    
+    def _search_batch(self, queries: List[str], encode_batch_size: Optional[int] = None,
+                      filters: Optional[List[Optional[Tuple[Tuple[str, str], ...]]]] = None
+                      ) -> List[Tuple[List[int], float, np.ndarray, Dict[str, float], IndexSnapshot]]:
+        """Encode a batch of queries, search the FAISS shards and fuse in BM25 hits.
+        
+        Unfiltered queries search every shard in one call; queries sharing a
+        filter search only the matching shards, restricted to matching chunks.
+        Rows carry the snapshot they were searched in, to look the chunks up in.
+        """
+        serving = self.serving
+        faiss_index, lexical_index = serving.faiss_index, serving.lexical_index
+        encode_batch_size = encode_batch_size or len(queries)
+        filters = filters or [None] * len(queries)
+        started = time.perf_counter()
+        query_embeddings = np.concatenate([
+            self._embed_texts(queries[start:start + encode_batch_size])
+            for start in range(0, len(queries), encode_batch_size)
+        ])
+        encoded = time.perf_counter()
+        groups: Dict[Any, List[int]] = {}
+        for position, filter_key in enumerate(filters):
+            groups.setdefault(filter_key, []).append(position)
+        lexical_masks: Dict[Any, np.ndarray] = {}
+        if list(groups) == [None]:
+            scores, indices = faiss_index.search(query_embeddings, self.max_results)
+        else:
+            scores = np.full((len(queries), self.max_results), -np.inf, dtype='float32')
+            indices = np.full((len(queries), self.max_results), -1, dtype='int64')
+            for filter_key, positions in groups.items():
+                shard_keys, allowed_ids = None, None
+                if filter_key is not None:
+                    shard_keys, lexical_masks[filter_key], allowed_ids = self._resolve_filter(serving, filter_key)
+                scores[positions], indices[positions] = faiss_index.search(
+                    query_embeddings[positions], self.max_results, keys=shard_keys, ids=allowed_ids)
+        searched = time.perf_counter()
+        
+        rows = []
+        for query, filter_key, query_scores, query_indices, embedding in zip(queries, filters, scores, indices, query_embeddings):
+            chunk_ids = [int(idx) for idx in query_indices if idx >= 0]
+            score = float(query_scores[0]) if chunk_ids else 0.0
+            if self.hybrid_search and len(lexical_index):
+                # BM25 documents are the chunk store's rows in the same order
+                mask = lexical_masks.get(filter_key)
+                _, lexical_ids, coverage = lexical_index.search(query, self.max_results, mask)
+                chunk_ids = reciprocal_rank_fusion([query_indices, lexical_ids], self.max_results, self.rrf_k)
+                # Exact matches on rider names or clause numbers count as confident retrieval too
+                score = max(score, coverage)
+            rows.append((chunk_ids, score, embedding))
+        timings = {"embed": encoded - started, "search": searched - encoded}
+        if self.hybrid_search and len(lexical_index):
+            timings["lexical"] = time.perf_counter() - searched
+        # Batch-level durations, recorded once per batch rather than once per query
+        for stage, seconds in timings.items():
+            stage_seconds.observe(seconds, stage)
+        return [row + (timings, serving) for row in rows]
+    
+    def _build_retrieval_result(self, serving: IndexSnapshot, chunk_ids: List[int], score: float,
+                                embedding: Optional[np.ndarray] = None) -> RetrievalResult:
+        """Pack the retrieved chunks into context and cite only the policies that made it in"""
+        records = []
+        for chunk_id in chunk_ids:
+            doc = serving.documents.get(chunk_id)
+            if doc is not None:
+                records.append((chunk_id, doc))
+        if not records:
+            return RetrievalResult(context="", sources=[], score=0.0, embedding=embedding)
+        vectors = None
+        if embedding is not None and len(records) > 1:
+            # MMR works on the stored vectors; None (e.g. a shard that cannot reconstruct) keeps retrieval order
+            vectors = serving.faiss_index.reconstruct([chunk_id for chunk_id, _ in records],
+                                                      [self._shard_key(doc) for _, doc in records])
+        selected, tokens = self.context_assembler.assemble(
+            [doc["content"] for _, doc in records], embedding, vectors)
+        included = [records[position][1] for position in selected]
+        sources = list(dict.fromkeys(source for doc in included for source in doc["sources"]))
         return RetrievalResult(
-            context=context,
-            sources=list(sources),
-            score=top_score
+            context="\n\n".join(doc["content"] for doc in included),
+            sources=sources,
+            score=score,
+            embedding=embedding,
+            context_tokens=tokens
         )
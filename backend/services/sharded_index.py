@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .index_factory import apply_search_params, index_memory_bytes, remove_ids, search_parameters
+
+if TYPE_CHECKING:
+    import faiss
+
+SHARDS_DIR = "shards"               # inside the index directory
+SHARDS_FILE = "shards.json"         # shard keys; shard i is stored in "{i}.faiss"
+TEMPLATE_FILE = "template.faiss"    # empty, trained index cloned for new shards
+
+
+class ShardedIndex:
+    """One ID-mapped FAISS index per shard key (an insurer, product line or document type).
+
+    Every shard is cloned from one empty template that is trained once, so
+    IVF shards share their centroids. A search runs on the selected shards in
+    parallel (FAISS releases the GIL) and merges the per-shard top-k by score;
+    an optional ID set restricts results on the remaining metadata fields.
+    """
+
+    def __init__(self, template: "faiss.Index", shards: Optional[Dict[str, "faiss.Index"]] = None,
+                 search_threads: int = 0):
+        self.template = template
+        self.shards: Dict[str, "faiss.Index"] = dict(shards or {})
+        self.search_params: Optional[Dict[str, int]] = None
+        self.search_threads = search_threads or min(8, os.cpu_count() or 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._direct_map_lock = threading.Lock()
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards.values())
+
+    def add_with_ids(self, embeddings: np.ndarray, ids: np.ndarray, keys: Sequence[str]):
+        """Add vectors, each to the shard of its key; shards are created on first use"""
+        import faiss
+        keys = np.asarray(keys, dtype=object)
+        for key in dict.fromkeys(keys.tolist()):
+            rows = keys == key
+            shard = self.shards.get(key)
+            if shard is None:
+                shard = self.shards[key] = faiss.clone_index(self.template)
+                if self.search_params is not None:
+                    apply_search_params(shard, self.search_params)
+            shard.add_with_ids(np.ascontiguousarray(embeddings[rows]), np.ascontiguousarray(ids[rows]))
+
+    def remove_ids(self, ids: np.ndarray):
+        """Remove vectors by ID from whichever shards hold them, dropping shards left empty"""
+        import faiss
+        for key, shard in list(self.shards.items()):
+            shard_ids = faiss.vector_to_array(shard.id_map)
+            present = np.isin(shard_ids, ids)
+            if not present.any():
+                continue
+            ivf = faiss.try_extract_index_ivf(shard)
+            direct_map = ivf is not None and ivf.direct_map.type != faiss.DirectMap.NoMap
+            if direct_map:
+                # Removal through the ID map is not supported with a direct map; rebuilt below
+                ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+            shard = remove_ids(shard, shard_ids[present])
+            if shard.ntotal == 0:
+                del self.shards[key]
+            else:
+                if self.search_params is not None:
+                    apply_search_params(shard, self.search_params)
+                if direct_map:
+                    self._enable_direct_map(shard)
+                self.shards[key] = shard
+
+    def apply_search_params(self, search_params: Dict[str, int]):
+        self.search_params = search_params
+        for shard in self.shards.values():
+            apply_search_params(shard, search_params)
+
+    def search(self, queries: np.ndarray, k: int, keys: Optional[Sequence[str]] = None,
+               ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, IDs) over the shards in keys (all when None), optionally only among ids"""
+        import faiss
+        selected = list(self.shards.values()) if keys is None else [self.shards[key] for key in keys if key in self.shards]
+        if not selected or (ids is not None and not len(ids)):
+            return np.full((len(queries), k), -np.inf, dtype='float32'), np.full((len(queries), k), -1, dtype='int64')
+        # Shared by all shard searches and kept alive until they finish
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype='int64')) if ids is not None else None
+
+        def search_shard(shard: "faiss.Index") -> Tuple[np.ndarray, np.ndarray]:
+            if selector is None:
+                return shard.search(queries, k)
+            return shard.search(queries, k, params=search_parameters(shard, self.search_params, selector))
+
+        if len(selected) == 1:
+            return search_shard(selected[0])
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.search_threads, thread_name_prefix="shard-search")
+        results = list(self._executor.map(search_shard, selected))
+        scores = np.concatenate([shard_scores for shard_scores, _ in results], axis=1)
+        labels = np.concatenate([shard_labels for _, shard_labels in results], axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+    def reconstruct(self, ids: Sequence[int], keys: Sequence[str]) -> Optional[np.ndarray]:
+        """Stored vectors of chunk IDs in the given shards, or None if a shard cannot return them.
+
+        IVF shards need an ID-to-list hash map, built by load() and otherwise on
+        first use; flat and HNSW shards return their vectors directly and IVF-PQ
+        returns approximations.
+        """
+        vectors = np.empty((len(ids), self.template.d), dtype='float32')
+        try:
+            for row, (chunk_id, key) in enumerate(zip(ids, keys)):
+                shard = self.shards[key]
+                try:
+                    vectors[row] = shard.reconstruct(int(chunk_id))
+                except RuntimeError:
+                    self._enable_direct_map(shard)
+                    vectors[row] = shard.reconstruct(int(chunk_id))
+        except (KeyError, RuntimeError):
+            return None
+        return vectors
+
+    def _enable_direct_map(self, shard: "faiss.Index"):
+        import faiss
+        with self._direct_map_lock:
+            ivf = faiss.try_extract_index_ivf(shard)
+            if ivf is None or ivf.direct_map.type != faiss.DirectMap.NoMap:
+                raise RuntimeError("shard cannot reconstruct vectors")
+            # A hash map, because IDs within an IDMap shard are sequential but vectors may be removed
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    def memory_bytes(self) -> int:
+        return sum(index_memory_bytes(shard) for shard in self.shards.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Vectors per shard, with the shard of chunks whose key is unknown listed as "unassigned" """
+        return {key or "unassigned": int(shard.ntotal) for key, shard in self.shards.items()}
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return (Path(directory) / SHARDS_DIR / SHARDS_FILE).exists()
+
+    def save(self, directory: str):
+        import faiss
+        shard_dir = Path(directory) / SHARDS_DIR
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        keys = list(self.shards)
+        files = [TEMPLATE_FILE] + [f"{position}.faiss" for position in range(len(keys))]
+        # Write beside and rename, so processes serving a memory map of the old files keep working
+        for name, index in zip(files, [self.template] + [self.shards[key] for key in keys]):
+            faiss.write_index(index, str(shard_dir / f"{name}.tmp"))
+            os.replace(shard_dir / f"{name}.tmp", shard_dir / name)
+        with open(shard_dir / f"{SHARDS_FILE}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({"keys": keys}, f)
+        os.replace(shard_dir / f"{SHARDS_FILE}.tmp", shard_dir / SHARDS_FILE)
+        for path in shard_dir.glob("*.faiss"):
+            if path.name not in files:
+                path.unlink()
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "ShardedIndex":
+        """Read all shards, memory-mapped read-only when serving"""
+        import faiss
+        shard_dir = Path(directory) / SHARDS_DIR
+        with open(shard_dir / SHARDS_FILE, 'r', encoding='utf-8') as f:
+            keys: List[str] = json.load(f)["keys"]
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        template = faiss.read_index(str(shard_dir / TEMPLATE_FILE))
+        shards = {key: faiss.read_index(str(shard_dir / f"{position}.faiss"), flags)
+                  for position, key in enumerate(keys)}
+        index = cls(template, shards)
+        # Built here rather than by the first query that reconstructs vectors for MMR
+        for shard in shards.values():
+            ivf = faiss.try_extract_index_ivf(shard)
+            if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+                index._enable_direct_map(shard)
+        return index
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from backend.services.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingBatch:
+    """process_batch that records every batch it is handed and upper-cases the queries"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, queries):
+        self.batches.append(list(queries))
+        return [query.upper() for query in queries]
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    async def scenario():
+        process = RecordingBatch()
+        batcher = EmbeddingBatcher(process, window_ms=10_000, max_batch_size=3)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(query) for query in ["a", "b", "c"]))
+        assert time.perf_counter() - started < 1
+        assert results == ["A", "B", "C"]
+        assert process.batches == [["a", "b", "c"]]
+    asyncio.run(scenario())
+
+
+def test_window_flushes_a_partial_batch():
+    async def scenario():
+        process = RecordingBatch()
+        batcher = EmbeddingBatcher(process, window_ms=20, max_batch_size=32)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        assert results == ["A", "B"]
+        assert process.batches == [["a", "b"]]
+        assert batcher.stats()["pending"] == 0
+    asyncio.run(scenario())
+
+
+def test_overflow_goes_to_the_next_batch():
+    async def scenario():
+        process = RecordingBatch()
+        batcher = EmbeddingBatcher(process, window_ms=20, max_batch_size=2)
+        results = await asyncio.gather(*(batcher.submit(query) for query in ["a", "b", "c"]))
+        assert results == ["A", "B", "C"]
+        assert process.batches == [["a", "b"], ["c"]]
+        assert batcher.stats()["largest_batch"] == 2
+    asyncio.run(scenario())
+
+
+def test_batch_failure_reaches_every_caller():
+    async def scenario():
+        def fail(queries):
+            raise RuntimeError("encoder down")
+        batcher = EmbeddingBatcher(fail, window_ms=5, max_batch_size=8)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import numpy as np
+
+from backend.services.lexical_index import LexicalIndex
+
+DOCUMENTS = [
+    (0, "Room rent is capped at 1% of the sum insured"),
+    (1, "Pre-existing diseases are covered after a waiting period of 48 months"),
+    (2, "Maternity cover has a waiting period of 9 months under clause 4.1.2"),
+    (5, "Cashless hospitalisation at network hospitals"),
+]
+QUERIES = ["waiting period", "room rent sum insured", "clause 4.1.2", "cashless network", "maternity"]
+
+
+def assert_same_results(index: LexicalIndex, expected: LexicalIndex):
+    assert list(index.doc_ids) == list(expected.doc_ids)
+    for query in QUERIES:
+        scores, ids, coverage = index.search(query, 3)
+        expected_scores, expected_ids, expected_coverage = expected.search(query, 3)
+        assert list(ids) == list(expected_ids), query
+        assert np.allclose(scores, expected_scores) and np.isclose(coverage, expected_coverage), query
+
+
+def test_update_matches_full_build():
+    added = [(7, "Ambulance charges up to 2000 per hospitalisation"), (8, "Maternity waiting period waived on renewal")]
+    updated = LexicalIndex.build(DOCUMENTS).update({1, 5}, added)
+    assert_same_results(updated, LexicalIndex.build([DOCUMENTS[0], DOCUMENTS[2]] + added))
+    # Terms only the removed documents contained leave the vocabulary
+    assert "cashless" not in updated.terms
+
+
+def test_update_leaves_source_index_untouched(tmp_path):
+    index = LexicalIndex.build(DOCUMENTS)
+    index.save(tmp_path)
+    loaded = LexicalIndex.load(tmp_path)
+    updated = loaded.update({0}, [(9, "Room rent waiver add-on")])
+    updated.save(tmp_path)
+    assert_same_results(loaded, index)
+    assert_same_results(LexicalIndex.load(tmp_path), updated)
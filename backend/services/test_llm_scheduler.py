@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.llm_scheduler import LLMDeadlineExceeded, LLMOverloaded, LLMScheduler
+
+
+class BlockingCall:
+    """A model call that blocks its thread until released, counting calls and the peak concurrency"""
+
+    def __init__(self, result="answer"):
+        self.result = result
+        self.released = threading.Event()
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.released.wait(5)
+            return self.result
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+async def settle():
+    """Let scheduled tasks take their slots and threads start"""
+    await asyncio.sleep(0.05)
+
+
+def test_concurrency_is_capped_and_the_rest_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2, max_queue=8)
+        call = BlockingCall()
+        runs = [asyncio.ensure_future(scheduler.run(call)) for _ in range(5)]
+        await settle()
+        stats = scheduler.stats()
+        assert (stats["in_flight"], stats["queued"]) == (2, 3)
+        call.released.set()
+        assert await asyncio.gather(*runs) == ["answer"] * 5
+        assert call.peak == 2
+        await settle()
+        assert (scheduler.in_flight, scheduler.queued) == (0, 0)
+    asyncio.run(scenario())
+
+
+def test_rejects_beyond_the_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+        call = BlockingCall()
+        runs = [asyncio.ensure_future(scheduler.run(call)) for _ in range(2)]
+        await settle()
+        assert scheduler.saturated()
+        with pytest.raises(LLMOverloaded):
+            await scheduler.run(call)
+        call.released.set()
+        await asyncio.gather(*runs)
+        assert not scheduler.saturated()
+    asyncio.run(scenario())
+
+
+def test_identical_calls_share_one_generation():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=0)
+        call = BlockingCall()
+        first = asyncio.ensure_future(scheduler.run(call, key="prompt"))
+        await settle()
+        # Joins the running call even though the scheduler is saturated
+        second = asyncio.ensure_future(scheduler.run(call, key="prompt"))
+        await settle()
+        assert scheduler.stats()["coalescing"] == 1
+        call.released.set()
+        assert await asyncio.gather(first, second) == ["answer", "answer"]
+        assert call.calls == 1
+        assert scheduler.stats()["coalescing"] == 0
+    asyncio.run(scenario())
+
+
+def test_deadline_expires_and_abandoned_queued_call_never_runs():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=4)
+        running = BlockingCall()
+        queued = BlockingCall()
+        first = asyncio.ensure_future(scheduler.run(running))
+        await settle()
+        with pytest.raises(LLMDeadlineExceeded):
+            await scheduler.run(queued, deadline=time.monotonic() + 0.05)
+        await settle()
+        # The caller gave up, so the queued call was dropped before it got a slot
+        assert scheduler.queued == 0
+        running.released.set()
+        queued.released.set()
+        assert await first == "answer"
+        await settle()
+        assert queued.calls == 0
+        assert (scheduler.in_flight, scheduler.queued) == (0, 0)
+    asyncio.run(scenario())
+
+
+def test_past_deadline_fails_without_waiting():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+        call = BlockingCall()
+        with pytest.raises(LLMDeadlineExceeded):
+            await scheduler.run(call, deadline=time.monotonic() - 1)
+        call.released.set()
+        await settle()
+        assert call.calls == 0
+    asyncio.run(scenario())
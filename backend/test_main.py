@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend import main
+from backend.services.llm_scheduler import LLMScheduler
+from backend.services.rag_service import RetrievalResult
+
+
+def post(path: str, payload: dict) -> httpx.Response:
+    """Call the app in-process; the startup hook (model and index loading) does not run"""
+    async def call():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.post(path, json=payload)
+    return asyncio.run(call())
+
+
+@pytest.fixture
+def ready_service(monkeypatch):
+    monkeypatch.setattr(main.rag_service, "state", "ready")
+    main.answer_cache.clear()
+
+    async def no_retrieval(queries, policy_filter=None):
+        raise AssertionError(f"retrieval should be skipped, got {queries}")
+    monkeypatch.setattr(main.rag_service, "retrieve_documents_batch", no_retrieval)
+    yield main.rag_service
+    main.answer_cache.clear()
+
+
+def test_batch_fully_served_from_answer_cache(ready_service):
+    answer = {"answer": "30 days", "sources": ["policy.pdf"], "retrieval_score": 0.9, "used_rag": True}
+    main.answer_cache.put("What is the waiting period?", None, answer, ready_service.index_version)
+
+    response = post("/ask/batch", {"questions": ["What is the waiting period?", "  "]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["answer"] == "30 days" and results[0]["error"] is None
+    assert results[1]["error"] == "Question cannot be empty"
+
+
+def test_empty_batch(ready_service):
+    response = post("/ask/batch", {"questions": []})
+    assert response.status_code == 200
+    assert response.json() == {"results": []}
+
+
+class StreamingLLM:
+    """Stands in for the LLM service: a real scheduler and a scripted token stream"""
+
+    def __init__(self, tokens, error=None):
+        self.scheduler = LLMScheduler()
+        self.tokens = tokens
+        self.error = error
+
+    async def stream_rag_response(self, query, context, sources, deadline=None):
+        for token in self.tokens:
+            yield token
+        if self.error is not None:
+            raise self.error
+
+
+def sse_events(response: httpx.Response) -> list:
+    """(event, data) pairs of a Server-Sent Events body"""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def retrieved(ready_service, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_THRESHOLD", "0.5")
+    result = RetrievalResult(context="Waiting period: 30 days", sources=["hdfc_ergo/policy.pdf"], score=0.9)
+
+    async def lookup(question, policy_filter=None):
+        return None, result, ready_service.index_version
+    monkeypatch.setattr(main, "lookup_answer", lookup)
+
+
+def test_stream_sends_metadata_then_tokens_then_done(retrieved, monkeypatch):
+    monkeypatch.setattr(main, "get_llm_service", lambda: StreamingLLM(["30 ", "days"]))
+
+    events = sse_events(post("/ask/stream", {"question": "What is the waiting period?"}))
+
+    assert [event for event, _ in events] == ["metadata", "token", "token", "done"]
+    assert events[0][1] == {"sources": ["hdfc_ergo/policy.pdf"], "retrieval_score": 0.9, "used_rag": True}
+    assert "".join(data["text"] for event, data in events if event == "token") == "30 days"
+    assert main.answer_cache.get_exact("What is the waiting period?", main.rag_service.index_version)["answer"] == "30 days"
+
+
+def test_stream_failure_ends_with_error_and_is_not_cached(retrieved, monkeypatch):
+    monkeypatch.setattr(main, "get_llm_service", lambda: StreamingLLM(["30 "], error=RuntimeError("model down")))
+
+    events = sse_events(post("/ask/stream", {"question": "What is the waiting period?"}))
+
+    assert [event for event, _ in events] == ["metadata", "token", "error"]
+    assert main.answer_cache.get_exact("What is the waiting period?", main.rag_service.index_version) is None
+
+
+def test_stream_replays_a_cached_answer(ready_service, monkeypatch):
+    monkeypatch.setattr(main, "get_llm_service", lambda: StreamingLLM([], error=AssertionError("LLM should not be called")))
+    answer = {"answer": "30 days", "sources": ["hdfc_ergo/policy.pdf"], "retrieval_score": 0.9, "used_rag": True}
+    main.answer_cache.put("What is the waiting period?", None, answer, ready_service.index_version)
+
+    events = sse_events(post("/ask/stream", {"question": "What is the waiting period?"}))
+
+    assert events == [
+        ("metadata", {"sources": ["hdfc_ergo/policy.pdf"], "retrieval_score": 0.9, "used_rag": True}),
+        ("token", {"text": "30 days"}),
+        ("done", {}),
+    ]